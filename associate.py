@@ -0,0 +1,35 @@
+from collections import Counter
+
+ASSOC_LIMIT = 9  # 一次顯示的聯想詞數，以 1-9 選取
+
+class AssociationIndex:
+    """聯想詞索引：首字 -> 以該字開頭的詞組。
+
+    詞庫沒有使用頻率，詞組改依收錄它的 key2ph 鍵數排序（同鍵數保留載入順序），
+    即以不同鍵位收錄的詞組排在前面；載入時建好，之後不再修改，可放在共用的快照中。
+    本次輸入中選用過的聯想詞由呼叫端以 used 傳入，排在更前面。
+    """
+
+    def __init__(self, key2ph):
+        key_counts = Counter()  # 詞組 -> 收錄它的鍵數
+        for key in key2ph:  # CompactPhraseTable.values 是欄位陣列，不能用 .values()
+            for _, words in key2ph[key]:
+                phrase = ''.join(words)
+                if len(phrase) > 1:
+                    key_counts[phrase] += 1
+        by_first = {}
+        for phrase in sorted(key_counts, key=key_counts.__getitem__, reverse=True):
+            by_first.setdefault(phrase[0], []).append(phrase)
+        self.by_first = {char: tuple(phrases) for char, phrases in by_first.items()}
+
+    def __len__(self):
+        return len(self.by_first)
+
+    def continuations(self, text, used=None, limit=ASSOC_LIMIT):
+        """text 最後一個字之後可接的文字（不含該字），最多 limit 個；used 為本次輸入選用過的詞組次數。"""
+        if not text:
+            return []
+        phrases = self.by_first.get(text[-1], ())
+        if used:
+            phrases = sorted(phrases, key=lambda phrase: -used[phrase])
+        return [phrase[1:] for phrase in phrases[:limit]]
@@ -0,0 +1,28 @@
+import contextlib
+import os
+import tempfile
+
+# Replace generated files atomically.
+#
+# Compiled tables are memory-mapped by running sessions and may be rebuilt
+# by several processes at once, so they are never truncated in place: each
+# writer gets its own temporary file in the target directory and renames
+# it over the old file when complete.  Readers keep the old inode until
+# they reopen, and concurrent writers cannot remove each other's file.
+
+@contextlib.contextmanager
+def replace_file(path, mode='wb', encoding=None):
+    """以 with 開啟 path 的暫存檔；區塊正常結束時以 os.replace 換上，發生例外時刪除暫存檔。"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as file:
+            try:  # mkstemp 建立的檔案只有擁有者可讀，沿用舊檔的權限
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+            except FileNotFoundError:
+                os.chmod(tmp_path, 0o644)
+            yield file
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
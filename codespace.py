@@ -0,0 +1,78 @@
+# Three-key code space helpers: 26 * 26 * 26 = 17576 codes.
+
+KEYORDER = "abcdefghijklmnopqrstuvwxyz"
+EMPTY_SLOT = "﹏"
+CODE_SPACE = 26 ** 3
+
+def code_index(code):
+    """三個小寫字母的碼轉為 0..17575 的索引；不是三碼時回傳 -1。"""
+    if len(code) != 3:
+        return -1
+    index = 0
+    for key in code:
+        offset = ord(key) - 97
+        if not 0 <= offset < 26:
+            return -1
+        index = index * 26 + offset
+    return index
+
+def block_index(block):
+    """兩個小寫字母的區塊轉為 0..675 的索引；不是兩碼時回傳 -1。"""
+    index = code_index(block + 'a') if len(block) == 2 else -1
+    return index // 26 if index >= 0 else -1
+
+def used_codes(mem2char):
+    """列出 mem2char 中有字的三碼與對應字。"""
+    for block, row in mem2char.items():
+        for offset, char in enumerate(row):
+            if char != EMPTY_SLOT:
+                yield block + KEYORDER[offset], char
+
+class UniqueCodes:
+    """三碼唯一性點陣圖與可直接上屏的詞組鍵。
+
+    一個三碼只有在 mem2char 有字、且不是任何詞組鍵或 lime 鍵（或其前綴）時才算唯一；
+    詞組鍵則需只有一個詞組，且不是其他詞組鍵、lime 鍵或已用三碼的前綴。
+    """
+
+    def __init__(self, mem2char, key2ph, keys2word):
+        proper_prefixes = set()
+        full_keys = set()
+        for table in (key2ph, keys2word):
+            for key in table:
+                full_keys.add(key)
+                for i in range(1, len(key)):
+                    proper_prefixes.add(key[:i])
+
+        self.bits = bytearray(CODE_SPACE // 8 + 1)
+        code_prefixes = set()
+        for code, _ in used_codes(mem2char):
+            code_prefixes.update((code[:1], code[:2], code))
+            if code not in proper_prefixes and code not in full_keys:
+                index = code_index(code)
+                if index >= 0:
+                    self.bits[index >> 3] |= 1 << (index & 7)
+
+        self.phrase_keys = frozenset(
+            key for key in key2ph
+            if len(key2ph[key]) == 1 and key not in proper_prefixes
+            and key not in keys2word and key not in code_prefixes)
+
+    def excluding(self, keys):
+        """回傳副本，其中 keys 及其前綴都不再唯一（例如使用者詞庫變動過的鍵）。"""
+        blocked = {key[:i] for key in keys for i in range(1, len(key) + 1)}
+        copy = object.__new__(UniqueCodes)
+        copy.bits = bytearray(self.bits)
+        for key in blocked:
+            index = code_index(key)
+            if index >= 0:
+                copy.bits[index >> 3] &= ~(1 << (index & 7))
+        copy.phrase_keys = self.phrase_keys - blocked
+        return copy
+
+    def is_unique(self, code):
+        index = code_index(code)
+        return index >= 0 and bool(self.bits[index >> 3] & (1 << (index & 7)))
+
+    def count(self):
+        return sum(bin(byte).count('1') for byte in self.bits)
@@ -0,0 +1,334 @@
+import os
+import subprocess
+import sys
+from array import array
+from collections.abc import Mapping
+
+# Columnar storage for the lookup tables.
+#
+# The loaders build key -> list structures with several Python objects per
+# entry (list, tuple, one-element phrase list, str).  Instead the tables are
+# stored as:
+#   - one string pool (a UTF-8 buffer plus an offsets array) for all values,
+#     with the keys themselves interned; tables whose values repeat (the
+#     lime file) store each distinct value once,
+#   - per-key [start, end) ranges into flat value arrays,
+#   - a key -> row dict for O(1) membership and lookup.
+# Lookups rebuild the same list shapes the loaders produced, so callers keep
+# using `key in table`, `table[key]`, iteration and `.items()` unchanged.
+#
+# filtered() builds a view that shares the pool and the key dict but has its
+# own [start, end) ranges, so a candidate filter is paid for once per table
+# instead of on every lookup.
+
+class StringPool:
+    """以單一 UTF-8 位元組緩衝區加上位移陣列存放所有值字串。
+
+    載入期間只寫入 bytearray，不保留逐筆的 str 物件；以 pool[id] 解碼取回對應的字串。
+    dedupe=True 時相同的字串只存一次：以 array 實作的開放定址雜湊表記錄 id + 1，
+    比對時直接比較池中的位元組，不建立 dict 或 str 物件；freeze() 後釋放。
+    只用於值大量重複的表，例如 lime 檔。
+    """
+
+    def __init__(self, dedupe=False):
+        self.data = bytearray()
+        self.offsets = array('I', [0])
+        self.slots = array('I', bytes(4 * 1024)) if dedupe else None
+
+    def raw(self, string_id):
+        return bytes(self.data[self.offsets[string_id]:self.offsets[string_id + 1]])
+
+    def intern(self, s):
+        data = s.encode('utf-8')
+        if self.slots is not None:
+            mask = len(self.slots) - 1
+            slot = hash(data) & mask
+            while self.slots[slot]:
+                if self.raw(self.slots[slot] - 1) == data:
+                    return self.slots[slot] - 1
+                slot = (slot + 1) & mask
+        string_id = len(self.offsets) - 1
+        self.data += data
+        self.offsets.append(len(self.data))
+        if self.slots is not None:
+            self.slots[slot] = string_id + 1
+            if 2 * len(self.offsets) > len(self.slots):
+                self.grow()
+        return string_id
+
+    def grow(self):
+        self.slots = array('I', bytes(8 * len(self.slots)))
+        mask = len(self.slots) - 1
+        for string_id in range(len(self)):
+            slot = hash(self.raw(string_id)) & mask
+            while self.slots[slot]:
+                slot = (slot + 1) & mask
+            self.slots[slot] = string_id + 1
+
+    def freeze(self):
+        self.data = bytes(self.data)
+        self.slots = None
+
+    def __getitem__(self, string_id):
+        return self.data[self.offsets[string_id]:self.offsets[string_id + 1]].decode('utf-8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+class ListTableBuilder:
+    """在載入時累積 (key, str) 配對，不為每個 key 建立 list。
+
+    支援載入函式原本對 dict 的用法：`key in b`、`b[key] = [word]`、
+    `b[key].append(word)`；完成後以 CompactListTable(b) 凍結。
+    """
+
+    class Appender:
+        def __init__(self, builder, key):
+            self.builder = builder
+            self.key = key
+
+        def append(self, word):
+            self.builder.add(self.key, word)
+
+        def extend(self, words):
+            for word in words:
+                self.builder.add(self.key, word)
+
+    def __init__(self, dedupe=False):
+        self.pool = StringPool(dedupe)
+        self.rows = {}
+        self.row_of = array('I')
+        self.ids = array('I')
+
+    def add(self, key, word):
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[sys.intern(key)] = len(self.rows)
+        self.row_of.append(row)
+        self.ids.append(self.pool.intern(word))
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __getitem__(self, key):
+        return ListTableBuilder.Appender(self, key)
+
+    def __setitem__(self, key, words):
+        for word in words:
+            self.add(key, word)
+
+class CompactListTable(Mapping):
+    """key -> [str, ...] 的唯讀表，用於 keys2word 與 type_pinyin1 的 key2ph。"""
+
+    def __init__(self, table):
+        if not isinstance(table, ListTableBuilder):
+            builder = ListTableBuilder()
+            for key, words in table.items():
+                builder[key] = words
+            table = builder
+        self.pool = table.pool
+        self.pool.freeze()
+        self.rows = table.rows
+
+        # Counting sort of the (row, id) pairs by row, keeping insertion order within a row
+        counts = array('I', bytes(4 * (len(self.rows) + 1)))
+        for row in table.row_of:
+            counts[row + 1] += 1
+        for row in range(len(self.rows)):
+            counts[row + 1] += counts[row]
+        self.starts = array('I', counts)
+        self.values = array('I', bytes(4 * len(table.ids)))
+        for row, string_id in zip(table.row_of, table.ids):
+            self.values[counts[row]] = string_id
+            counts[row] += 1
+        table.row_of = table.ids = None
+
+    def __getitem__(self, key):
+        row = self.rows[key]
+        pool = self.pool
+        return [pool[i] for i in self.values[self.starts[row]:self.starts[row + 1]]]
+
+    def filtered(self, keep):
+        """回傳只保留 keep(word) 為真之值的唯讀檢視；值全被濾掉的 key 視為不存在。"""
+        view = object.__new__(FilteredListTable)
+        view.pool, view.rows = self.pool, self.rows
+        kept = [keep(word) for word in (self.pool[i] for i in range(len(self.pool)))]
+        view.starts, (view.values,) = filter_ranges(self.starts, (self.values,), lambda i: kept[self.values[i]])
+        view.size = count_rows(view.starts)
+        return view
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+class CompactPhraseTable(Mapping):
+    """key -> [(num, [phrase]), ...] 的唯讀表，用於 cuf1 的 key2ph。"""
+
+    def __init__(self, key2ph):
+        self.pool = StringPool()
+        self.rows = {}
+        self.starts = array('I', [0])
+        self.numbers = array('i')
+        self.values = array('I')
+        for key, entries in key2ph.items():
+            self.rows[sys.intern(key)] = len(self.rows)
+            for number, words in entries:
+                self.numbers.append(number)
+                self.values.append(self.pool.intern(''.join(words)))
+            self.starts.append(len(self.values))
+        self.pool.freeze()
+
+    def __getitem__(self, key):
+        row = self.rows[key]
+        start, end = self.starts[row], self.starts[row + 1]
+        pool = self.pool
+        return [(number, [pool[i]]) for number, i in zip(self.numbers[start:end], self.values[start:end])]
+
+    def filtered(self, keep):
+        """回傳只保留 keep(phrase) 為真之詞組的唯讀檢視；詞組保留原編號。"""
+        view = object.__new__(FilteredPhraseTable)
+        view.pool, view.rows = self.pool, self.rows
+        view.starts, (view.numbers, view.values) = filter_ranges(
+            self.starts, (self.numbers, self.values), lambda i: keep(self.pool[self.values[i]]))
+        view.size = count_rows(view.starts)
+        return view
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+def filter_ranges(starts, columns, keep):
+    """依 keep(i) 篩選每列 [start, end) 範圍內的平行欄位，回傳新的 (starts, columns)。"""
+    new_starts = array('I', [0])
+    new_columns = tuple(array(column.typecode) for column in columns)
+    for row in range(len(starts) - 1):
+        for i in range(starts[row], starts[row + 1]):
+            if keep(i):
+                for column, new_column in zip(columns, new_columns):
+                    new_column.append(column[i])
+        new_starts.append(len(new_columns[0]))
+    return new_starts, new_columns
+
+def count_rows(starts):
+    return sum(1 for row in range(len(starts) - 1) if starts[row] < starts[row + 1])
+
+class FilteredRows:
+    """filtered() 檢視共用原表的 key -> row；空的列在查詢與迭代時略過。"""
+
+    def row(self, key):
+        row = self.rows[key]
+        if self.starts[row] == self.starts[row + 1]:
+            raise KeyError(key)
+        return row
+
+    def __contains__(self, key):
+        row = self.rows.get(key)
+        return row is not None and self.starts[row] < self.starts[row + 1]
+
+    def __iter__(self):
+        starts = self.starts
+        return (key for key, row in self.rows.items() if starts[row] < starts[row + 1])
+
+    def __len__(self):
+        return self.size
+
+class FilteredListTable(FilteredRows, CompactListTable):
+    def __getitem__(self, key):
+        row = self.row(key)
+        pool = self.pool
+        return [pool[i] for i in self.values[self.starts[row]:self.starts[row + 1]]]
+
+class FilteredPhraseTable(FilteredRows, CompactPhraseTable):
+    def __getitem__(self, key):
+        row = self.row(key)
+        start, end = self.starts[row], self.starts[row + 1]
+        pool = self.pool
+        return [(number, [pool[i]]) for number, i in zip(self.numbers[start:end], self.values[start:end])]
+
+def rss_kb():
+    """目前行程的 RSS（KB），讀自 /proc/self/status。"""
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def open_tries():
+    """開啟（必要時先編譯）lime 與 pinyin.cin 的 .tkt，回傳 (keys2word, pinyin_key2ph)。"""
+    import cuf1
+    import trie
+    import type_pinyin1
+
+    return (trie.open_trie(['cuf_keyboard_m01.lime'], cuf1.read_lime_pairs),
+            trie.open_trie(['pinyin.cin'], type_pinyin1.read_tables))
+
+def load_all(compact, packed_trie=False):
+    """載入 pinyin.cin、lime 與 word*.txt；compact 為真時直接載入欄式表，
+    packed_trie 為真時 lime 與 pinyin.cin 改由 trie.py 編譯的 .tkt 就地查詢。"""
+    import cuf1
+    import type_pinyin1
+
+    if packed_trie:
+        keys2word, pinyin_key2ph = open_tries()
+        word2pinyin = cuf1.parse_lime_word2pinyin('cuf_keyboard_m01.lime')
+    elif compact:
+        word2pinyin, keys2word = cuf1.parse_lime_file('cuf_keyboard_m01.lime', ListTableBuilder(dedupe=True))
+        keys2word = CompactListTable(keys2word)
+    else:
+        word2pinyin, keys2word = cuf1.parse_lime_file('cuf_keyboard_m01.lime')
+    key2ph = {}
+    for file_name in os.listdir():
+        if file_name.startswith('word') and file_name.endswith('.txt'):
+            cuf1.parse_word_file(file_name, word2pinyin, key2ph)
+    if packed_trie:
+        key2ph = CompactPhraseTable(key2ph)
+    elif compact:
+        key2ph = CompactPhraseTable(key2ph)
+        pinyin_key2ph = CompactListTable(type_pinyin1.load_pinyin_cin('pinyin.cin', ListTableBuilder()))
+    else:
+        pinyin_key2ph = type_pinyin1.load_pinyin_cin('pinyin.cin')
+    return keys2word, key2ph, pinyin_key2ph
+
+def measure(mode, trace):
+    import gc
+    import tracemalloc
+
+    baseline = rss_kb()
+    if trace:
+        tracemalloc.start()
+    tables = load_all(mode != 'plain', mode == 'trie')
+    gc.collect()
+    if trace:
+        retained, peak = tracemalloc.get_traced_memory()
+        return retained // 1024, peak // 1024
+    return (rss_kb() - baseline,)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        print(*measure(sys.argv[1], len(sys.argv) > 2))
+    else:
+        # 每種量測各自在獨立行程中執行，避免前一次配置或 tracemalloc 本身影響 RSS
+        for table in open_tries():  # 先編譯 .tkt，量測時只計入開啟與查詢
+            table.close()
+        results = {}
+        for mode in ('plain', 'compact', 'trie'):
+            values = []
+            for extra in ([], ['trace']):
+                output = subprocess.run([sys.executable, __file__, mode] + extra,
+                                        capture_output=True, text=True, check=True)
+                values += [int(value) for value in output.stdout.split()[-(2 if extra else 1):]]
+            results[mode] = values
+        for label, column in (("RSS growth", 0), ("Retained by tables", 1), ("Peak while parsing", 2)):
+            plain, compact, packed = (results[mode][column] for mode in ('plain', 'compact', 'trie'))
+            print(f"{label:20}: plain {plain:8} KB, columnar {compact:8} KB ({1 - compact / plain:.0%} smaller), "
+                  f"packed trie {packed:8} KB ({1 - packed / plain:.0%} smaller)")
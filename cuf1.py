@@ -1,8 +1,27 @@
+import argparse
 import os
 import re
 import sys
 import termios
+import threading
 import tty
+from collections import Counter
+
+from associate import AssociationIndex
+from codespace import UniqueCodes
+from compact import CompactListTable, CompactPhraseTable, ListTableBuilder
+from fuzzy import DeleteIndex, format_suggestions
+from keywords import KEYWORD_FILE, KeywordIndex
+from lru import LRUCache
+from prefetch import USAGE_WEIGHT, Prefetcher
+from prefixindex import PrefixIndex
+from segment import Segmenter
+from sinks import OutputWriter, open_sink
+from snapshot import TableSnapshot, TableStore
+from tableconv import read_lime
+from trie import TrieTable, open_trie
+from uniok import FILTERS, CharsetBits, next_filter
+from userdict import USER_FILE, LayeredTable, UserOverlay
 
 def getch():
     """Reads a single character from standard input without requiring Enter."""
@@ -15,7 +34,7 @@ def getch():
         termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
     return char
 
-def paginate(data, lines_per_page=25):
+def paginate(data, lines_per_page=25, read_key=getch):
     """分頁顯示內容，每頁顯示指定行數。"""
     for i in range(0, len(data), lines_per_page):
         for line in data[i:i + lines_per_page]:
@@ -23,7 +42,7 @@ def paginate(data, lines_per_page=25):
         if i + lines_per_page < len(data):
             print("--- 按空白鍵繼續，或 q 結束 ---\n", end="", flush=True)
             while True:
-                char = getch()
+                char = read_key()
                 if char == ' ':
                     break
                 elif char == 'q':
@@ -166,10 +185,14 @@ def parse_lime_file_old(cin_file):
                         word2pinyin[character] = english[0] if english else ''
     return word2pinyin
 
-def parse_lime_file(lime_file):
-    """解析 .lime 檔案，建立 word2pinyin 結構。"""
+def parse_lime_file(lime_file, keys2word=None):
+    """解析 .lime 檔案，建立 word2pinyin 結構。
+
+    keys2word 可傳入 compact.ListTableBuilder，直接累積為欄式表。
+    """
     word2pinyin = {}
-    keys2word = {}
+    if keys2word is None:
+        keys2word = {}
     with open(lime_file, 'r', encoding='utf-8') as file:
         for line in file:
             line = line.strip()
@@ -190,6 +213,97 @@ def parse_lime_file(lime_file):
                     word2pinyin[character] = english[0] if english else ''
     return word2pinyin, keys2word
 
+def read_lime_pairs(lime_files):
+    """依序產生 lime 檔的 (key, word)，與 parse_lime_file 建立的 keys2word 相同，供編譯 .tkt。"""
+    for lime_file in lime_files:
+        yield from read_lime(lime_file, skip_empty_keys=False)
+
+def parse_lime_word2pinyin(lime_file):
+    """只建立 parse_lime_file 的 word2pinyin；keys2word 已由 .tkt 就地查詢時使用。"""
+    word2pinyin = {}
+    with open(lime_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            match = re.match(r'^([a-zA-Z]*\d*),([\u4e00-\u9fff]+):?.*$', line.strip())
+            if match and match[2][0] not in word2pinyin:
+                word2pinyin[match[2][0]] = match[1][0] if match[1] else ''
+    return word2pinyin
+
+def build_snapshot(generation, mem2char, key2ph, keys2word, word2pinyin=None, stage=None, **indexes):
+    """為載入好的表建立所有索引，包成不可修改的 TableSnapshot；indexes 可傳入已建好的索引。"""
+    if stage is None:
+        stage = lambda name, func, *args: func(*args)
+    if not isinstance(keys2word, (CompactListTable, TrieTable)):
+        keys2word = CompactListTable(keys2word)
+    if isinstance(keys2word, TrieTable) and indexes.get('lime_prefix') is None:
+        indexes['lime_prefix'] = keys2word  # .tkt 本身即可做前綴查詢
+    if not isinstance(key2ph, CompactPhraseTable):
+        key2ph = CompactPhraseTable(key2ph)
+    builders = {
+        'ph_index': ('DeleteIndex(key2ph)', DeleteIndex, key2ph),
+        'lime_index': ('DeleteIndex(keys2word)', DeleteIndex, keys2word),
+        'ph_prefix': ('PrefixIndex(key2ph)', PrefixIndex, key2ph),
+        'lime_prefix': ('PrefixIndex(keys2word)', PrefixIndex, keys2word),
+        'associations': ('AssociationIndex', AssociationIndex, key2ph),
+        'unique': ('UniqueCodes', UniqueCodes, mem2char, key2ph, keys2word),
+    }
+    for name, (label, func, *args) in builders.items():
+        if indexes.get(name) is None:
+            indexes[name] = stage(label, func, *args)
+    return TableSnapshot(generation, mem2char, key2ph, keys2word, word2pinyin=word2pinyin, **indexes)
+
+class TableLoader(threading.Thread):
+    """在背景執行緒載入 lime 檔與 word*.txt，讓輸入循環可以立即開始。
+
+    完成後把新的 TableSnapshot 發布到 store，並設定 ready 事件；
+    未指定 store 時建立一個以空表快照開始的 store。
+    也用於重新載入：同一個 store 上再啟動一次，輸入循環在下一個按鍵換上新快照。
+    """
+
+    def __init__(self, lime_file, word_files, mem2char=None, profiler=None, store=None):
+        super().__init__(daemon=True)
+        self.lime_file = lime_file
+        self.word_files = word_files
+        self.mem2char = mem2char if mem2char is not None else {}
+        self.profiler = profiler
+        self.ready = threading.Event()
+        self.store = store or TableStore(build_snapshot(0, self.mem2char, {}, {}))
+        self.snapshot = None
+
+    def stage(self, name, func, *args):
+        """執行一個載入步驟；有 profiler 時（--memory-report）記錄其記憶體用量。"""
+        if self.profiler is None:
+            return func(*args)
+        return self.profiler.measure(name, func, *args)
+
+    def run(self):
+        try:
+            generation = self.store.next_generation()
+            try:
+                # lime 編譯為 .tkt 後以 mmap 就地查詢；無法寫入 .tkt 時改為載入欄式表
+                keys2word = self.stage('open_trie(lime)', open_trie, [self.lime_file], read_lime_pairs)
+                word2pinyin = self.stage('parse_lime_word2pinyin', parse_lime_word2pinyin, self.lime_file)
+            except OSError:
+                word2pinyin, keys2word = self.stage('parse_lime_file', parse_lime_file, self.lime_file,
+                                                    ListTableBuilder(dedupe=True))
+                keys2word = self.stage('CompactListTable', CompactListTable, keys2word)
+            key2ph = {}
+            for file_name in self.word_files:
+                self.stage(f'parse_word_file({file_name})', parse_word_file, file_name, word2pinyin, key2ph)
+            key2ph = self.stage('CompactPhraseTable', CompactPhraseTable, key2ph)
+            self.snapshot = build_snapshot(generation, self.mem2char, key2ph, keys2word,
+                                           word2pinyin if self.profiler else None, self.stage)
+            self.store.sources = (self.lime_file, self.word_files)
+            self.store.publish(self.snapshot)
+        finally:
+            self.ready.set()
+            self.store.ready.set()
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
+
+LOAD_WAIT = 0.3  # 查詢需要的表還在載入時，最多等待的秒數
+CACHE_SIZE = 512  # 候選清單快取的 (mode, prefix) 數量上限
+
 import string
 
 def xlen(text):
@@ -229,7 +343,77 @@ def format_options(options, width=80):
 # Example usage:
 # print(format_options(options, width=80))
 
-def input_loop(key2ph, mem2char, keys2word):
+SEGMENT = re.compile(r'([a-zA-Z;/`?]+)(\d+)?')  # 英文（含 ; / ` ? 標記）加上可省略的編號
+
+def numbered_phrase(entries, num):
+    """key2ph 某鍵的 [(num, [phrase])] 中編號為 num 的詞組，沒有時回傳 None。"""
+    for number, words in entries:
+        if number == num:
+            return ''.join(words)
+    return None
+
+def commit_buffer(buffer, key2ph, mem2char, lookup, max_key_len=None, segmenter=None):
+    """空白鍵上屏：切分一次 buffer，依序解析每一段並回傳上屏文字。
+
+    lookup(mode, substring) 回傳 mode 為 '/'、'`'、';' 或 '?' 的候選清單，以編號直接取第 num 個；
+    沒有候選的段落不輸出。max_key_len 為 key2ph 最長鍵長，超過時不必查剩餘字串，
+    因此長的緩衝區也維持線性時間。
+    指定 segmenter（segment.Segmenter）時，不含標記的段落改以最佳切分解析。
+    """
+    output = []
+    for match in SEGMENT.finditer(buffer):
+        english, num_str = match.groups()
+        num = int(num_str) if num_str else 1  # Default to 1 if no number is provided
+        mode = next((marker for marker in '/`;?' if marker in english), None)
+
+        if mode is None and segmenter is not None:
+            output.append(segmenter.text(english, int(num_str) if num_str else None))
+            continue
+
+        if mode is not None:
+            substring = english.replace(mode, '')
+            if mode not in '`?' or substring:
+                options = lookup(mode, substring)
+                if 1 <= num <= len(options):
+                    output.append(''.join(options[num - 1][-1]))
+        elif english in key2ph:
+            phrase = numbered_phrase(key2ph[english], num)
+            if phrase:
+                output.append(phrase)
+        else:
+            # 當 key2ph 中無法找到英文單字時，每 3 個字元查 mem2char，直到剩餘部分為詞組鍵
+            for current_pos in range(0, len(english) - 2, 3):
+                mem_index, offset_char = english[current_pos:current_pos + 2], english[current_pos + 2]
+                offset = ord(offset_char) - ord('a')
+                if 'a' <= offset_char <= 'z' and mem_index in mem2char and offset < len(mem2char[mem_index]):
+                    output.append(mem2char[mem_index][offset])
+                else:
+                    output.append('?')  # 無效索引、偏移或非 'a'-'z' 字元時用占位符
+                rest_len = len(english) - current_pos - 3
+                if max_key_len is None or rest_len <= max_key_len:
+                    english2 = english[current_pos + 3:]
+                    if english2 in key2ph:
+                        phrase = numbered_phrase(key2ph[english2], num)
+                        if phrase:
+                            output.append(phrase)
+                        break
+
+        # 當沒有提供數字時，每組三碼直接查 mem2char，剩餘字元再對 key2ph 列出全部詞組；
+        # '?' 段落是助記關鍵字，不是三碼
+        if not num_str and mode != '?':
+            full = len(english) - len(english) % 3
+            for current_pos in range(0, full, 3):
+                key, index = english[current_pos:current_pos + 2], ord(english[current_pos + 2]) - ord('a')
+                if key in mem2char and 0 <= index < len(mem2char[key]):
+                    output.append(mem2char[key][index])
+            left_chars = english[full:]
+            if left_chars in key2ph:
+                output.extend(''.join(words) for _, words in key2ph[left_chars])
+    return ''.join(output)
+
+def input_loop(key2ph, mem2char, keys2word, ph_index=None, lime_index=None, loader=None, read_key=getch,
+               auto_commit=False, prefetch=True, charset_filter='all', associate=True, keywords=None, store=None,
+               outputs=(), overlay=None, segment='greedy'):
     hint_string_1 = """
 ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ
 ㄘㄅㄒㄉㄧㄈㄍㄏㄞㄐㄎㄌㄇㄋㄡㄆ　ㄖㄙㄊㄩㄑㄠㄨㄚㄗ
@@ -259,284 +443,463 @@ def input_loop(key2ph, mem2char, keys2word):
 
     """用戶輸入循環，支持即時查詢 key2ph 和 mem2char 結構。"""
     print("Enter input mode (Ctrl-C or Ctrl-D to exit):")
+
+    # 查詢表來自 store 中發布的快照；每個按鍵檢查一次是否有新快照（載入完成或重新載入）
+    # store 可直接傳入，讓多次呼叫（例如 difftest.py）共用同一份已載入的表
+    if store is None and loader is not None:
+        store = loader.store
+    elif store is None:
+        store = TableStore(build_snapshot(0, mem2char, key2ph, keys2word, ph_index=ph_index, lime_index=lime_index),
+                           ready=True)
+    snapshot = None
+    keyword_keys = list(keywords.keywords()) if keywords is not None and auto_commit else []
+
+    def adopt(new):
+        """換上新快照的表與索引，並讓舊表的快取與篩選檢視失效。"""
+        nonlocal snapshot, mem2char, key2ph, keys2word, ph_index, lime_index, ph_prefix, lime_prefix
+        nonlocal associations, unique, generation, views
+        snapshot = new
+        mem2char, key2ph, keys2word = new.mem2char, layer(new.key2ph), new.keys2word
+        ph_index, lime_index = new.ph_index, new.lime_index
+        ph_prefix, lime_prefix = new.ph_prefix, new.lime_prefix
+        associations = new.associations if associate else None
+        # 自動上屏：表載入完成前停用，避免與尚未載入的詞組鍵衝突；
+        # 使用者詞庫變動過的鍵與助記關鍵字（可接著打 '?'）及其前綴不自動上屏
+        unique = new.unique if auto_commit and store.ready.is_set() else None
+        if unique is not None and (overlay is not None or keyword_keys):
+            unique = unique.excluding([*keyword_keys, *(overlay.keys() if overlay is not None else ())])
+        generation += 1  # 預先計算中的舊表結果不會再被取用
+        cache.clear()
+        views = {'all': (new.key2ph, keys2word)}
+        if charset_filter != 'all' and store.ready.is_set():
+            select_view(charset_filter)
+
+    def tables_ready(timeout=0):
+        """換上最新發布的快照；第一次載入在 timeout 內仍未完成則回傳 False。"""
+        if not store.wait(timeout):
+            return False
+        if store.snapshot is not snapshot:
+            adopt(store.snapshot)
+        return True
+
+    def select_view(name):
+        """切換候選字集篩選；每種篩選的表只在第一次選用時建立。"""
+        nonlocal key2ph, keys2word, charsets, charset_filter, generation
+        if name not in views:
+            if charsets is None:
+                charsets = CharsetBits()
+            keep = charsets.keep(name)
+            full_ph, full_words = views['all']
+            if not isinstance(full_ph, CompactPhraseTable):
+                full_ph = CompactPhraseTable(full_ph)
+            if not isinstance(full_words, (CompactListTable, TrieTable)):
+                full_words = CompactListTable(full_words)
+            views[name] = (full_ph.filtered(keep), full_words.filtered(keep))
+        key2ph, keys2word = views[name]
+        key2ph = layer(key2ph)
+        charset_filter = name
+        generation += 1
+
+    def layer(table):
+        """有使用者詞庫時，key2ph 以 LayeredTable 疊在共用的基底表上。"""
+        return LayeredTable(table, overlay) if overlay is not None else table
+
+    unique = None
+
+    def auto_commit_text(segment):
+        """segment 為唯一三碼或唯一詞組鍵時回傳要上屏的文字，否則回傳 None。"""
+        if unique is None:
+            return None
+        if len(segment) == 3 and unique.is_unique(segment):
+            return mem2char[segment[:2]][ord(segment[2]) - ord('a')]
+        if segment in unique.phrase_keys and segment in key2ph:
+            return ''.join(key2ph[segment][0][1])
+        return None
+
+    cache = LRUCache(CACHE_SIZE)
+    generation = 0  # 快取鍵的第一項；換表或切換篩選時遞增
+    ph_prefix = lime_prefix = associations = None
+    usage = Counter()  # 實際打過的前綴次數，用於排序預先計算的下一鍵
+    views = {}  # 篩選名稱 -> (key2ph, keys2word)
+    charsets = None
+    adopt(store.snapshot)
+
+    def compute_candidates(mode, substring):
+        """回傳 (options, 顯示文字)。
+
+        mode ';' 為 key2ph 前綴查詢，'`' 為 keys2word 前綴查詢，'/' 為 keys2word 完全比對，
+        '?' 為助記關鍵字前綴查詢（options 為 (keyword, code, char)）。
+        """
+        options = []
+        if mode == '?':
+            options = keywords.search(substring) if keywords else []
+            text = format_options([(keyword, f"{char} {code}") for keyword, code, char in options], width=78)
+        elif mode == ';':
+            for key in ph_matches(substring):
+                for number, phrase in key2ph[key]:
+                    options.append((key, number, phrase))
+            text = "\n".join(f"{idx}: {key}{number} {''.join(option)}"
+                             for idx, (key, number, option) in enumerate(options, start=1))
+        else:
+            if mode == '`':
+                # 篩選後的表可能已不含前綴索引中的某些鍵
+                matched_keys = [key for key in lime_prefix.matches(substring) if key in keys2word]
+            else:
+                matched_keys = [substring] if substring in keys2word else []
+            for key in matched_keys:
+                for phrase in keys2word[key]:
+                    options.append((key, phrase))
+            text = format_options(options, width=78)
+        return options, text
+
+    def ph_matches(substring):
+        """以 substring 開頭、且目前 key2ph（篩選與使用者詞庫之後）仍有詞組的鍵。"""
+        keys = ph_prefix.matches(substring)
+        if isinstance(key2ph, LayeredTable):
+            return key2ph.matches(keys, substring)
+        return [key for key in keys if key in key2ph]
+
+    def candidates(mode, substring):
+        """同 compute_candidates；相同的 (mode, prefix) 直接由快取取得（可能已在閒置時預先計算）。"""
+        cache_key = (generation, mode, substring)
+        cached = cache.get(cache_key)
+        if cached is None:
+            cached = compute_candidates(mode, substring)
+            cache.put(cache_key, cached)
+        return cached
+
+    def rank_next(prefix):
+        """依表中鍵數與使用次數，排出 prefix 之後最可能的下一鍵。"""
+        weights = ph_prefix.next_keys(prefix) + lime_prefix.next_keys(prefix)
+        for key in weights:
+            weights[key] += usage[prefix + key] * USAGE_WEIGHT
+        return [key for key, _ in weights.most_common()]
+
+    # 聯想：上屏後列出以最後一個字開頭的詞組，緩衝區為空時按 1-9 直接上屏後半段
+    associated = []
+    associated_from = ''
+    associations_used = Counter()  # 本次輸入選用過的聯想詞；快照中的 AssociationIndex 不修改
+
+    def show_associations(text):
+        nonlocal associated, associated_from
+        associated = associations.continuations(text, associations_used) if associations and text else []
+        associated_from = text[-1:]
+        if associated:
+            print("Associated: " + "  ".join(f"{idx} {option}" for idx, option in enumerate(associated, start=1)))
+
+    def emit(text):
+        """上屏：顯示文字，並交給 --output 的背景寫出執行緒。"""
+        print(f"\nOutput: {text}")
+        for writer in outputs:
+            writer.submit(text)
+
+    prefetcher = None
+    if prefetch:
+        prefetcher = Prefetcher(cache, compute_candidates, rank_next)
+        prefetcher.start()
+
     buffer = ''
     output_buffer = ''
     num = 0
     pos = 0
-    while True:
-        try:
-            char = getch()
-        except (EOFError, KeyboardInterrupt):
-            print("\nExiting.")
-            break
-
-        if ord(char) in (3, 4):  # Ctrl-C (3) or Ctrl-D (4)
-            print("\nExiting.")
-            break
-
-        print(char, end='', flush=True)
-
-        if char == '~':
-            substring = buffer[pos:]
-            print("\nKey2Ph Table:")
-            matched_keys = [key for key in key2ph if key.startswith(substring)]
-            if matched_keys:
-                output = [f"{key}: {key2ph[key]}" for key in matched_keys]
-            else:
-                output = [f"{key}: {phrases}" for key, phrases in key2ph.items()]
-            paginate(output)
-            print(f"\rBuffer: {buffer}", end='', flush=True)
-            continue
+    try:
+        while True:
+            if prefetcher and store.ready.is_set():
+                prefetcher.request((generation,), buffer[pos:])
+            try:
+                char = read_key()
+            except (EOFError, KeyboardInterrupt):
+                print("\nExiting.")
+                break
+            finally:
+                if prefetcher:
+                    prefetcher.cancel()
+
+            if ord(char) in (3, 4):  # Ctrl-C (3) or Ctrl-D (4)
+                print("\nExiting.")
+                print(f"Candidate cache: {cache.stats()}")
+                if prefetcher:
+                    print(f"Prefetched candidate lists: {prefetcher.prefetched}")
+                break
 
-        if char == ';':
-            substring = buffer[pos:]
-            matched_keys = [key for key in key2ph if key.startswith(substring)]
-            if matched_keys:
-                print("\n")
-                options = []
-                for key in matched_keys:
-                    for number, phrase in key2ph[key]:
-                        options.append((key, number, phrase))
-                for idx, (key, number, option) in enumerate(options, start=1):
-                    print(f"{idx}: {key}{number} {''.join(option)}")
-            buffer += char
-            print(f"\rBuffer: {buffer}", end='', flush=True)
-            continue
+            if char == '\x12' and store.sources:  # Ctrl-R：背景重新載入 lime 與 word*.txt，繼續使用舊表直到完成
+                TableLoader(*store.sources, mem2char=snapshot.mem2char, store=store).start()
+                if overlay is not None:
+                    overlay = UserOverlay.load()  # 新的 overlay 在換上新快照時套用
+                print("\n(reloading tables...)")
+                print(f"\rBuffer: {buffer}", end='', flush=True)
+                continue
 
-        if char == '`':
-            substring = buffer[pos:]
-            if len(substring) == 0:
-                continue;
-            matched_keys = [key for key in keys2word if key.startswith(substring)]
-            if matched_keys:
-                print("\n")
-                options = []
-                for key in matched_keys:
-                    for phrase in keys2word[key]:
-                        # print(f"DEBUG: Processing key={key}, phrase={phrase}")  # Debug 訊息
-                        options.append((key, phrase))
-                print(format_options(options, width=78))
+            print(char, end='', flush=True)
 
-            buffer += char
-            print(f"\rBuffer: {buffer}", end='', flush=True)
-            continue
-            
-        if char == '/':
-            substring = buffer[pos:]
-            matched_keys = [key for key in keys2word if key == substring]
-            if matched_keys:
-                print("\n")
-                options = []
-                for key in matched_keys:
-                    for phrase in keys2word[key]:
-                        # print(f"DEBUG: Processing key={key}, phrase={phrase}")  # Debug 訊息
-                        options.append((key, phrase))
-                print(format_options(options, width=78))
+            if associated and not buffer and char.isdigit() and 1 <= int(char) <= len(associated):
+                continuation = associated[int(char) - 1]
+                associations_used[associated_from + continuation] += 1
+                emit(continuation)
+                show_associations(continuation)
+                continue
+            associated = []
 
-            buffer += char
-            print(f"\rBuffer: {buffer}", end='', flush=True)
-            continue
+            # 需要詞組 / lime 表的操作：稍候片刻，仍未載入完成則提示
+            if char in "~;`/ " and not tables_ready(LOAD_WAIT):
+                print("\n(loading...)")
+                if char in "~ ":
+                    print(f"\rBuffer: {buffer}", end='', flush=True)
+                    continue
+            else:
+                tables_ready()
+
+            if char == '~':
+                substring = buffer[pos:]
+                print("\nKey2Ph Table:")
+                matched_keys = [key for key in key2ph if key.startswith(substring)]
+                if matched_keys:
+                    output = [f"{key}: {key2ph[key]}" for key in matched_keys]
+                else:
+                    output = [f"{key}: {phrases}" for key, phrases in key2ph.items()]
+                paginate(output, read_key=read_key)
+                print(f"\rBuffer: {buffer}", end='', flush=True)
+                continue
 
+            if char == ';':
+                substring = buffer[pos:]
+                options, text = candidates(';', substring)
+                if options:
+                    print("\n")
+                    print(text)
+                elif ph_index and substring:
+                    # 索引建在未篩選的基底表上：只列出目前檢視中存在的鍵，並比對使用者新增的鍵
+                    suggestions = ph_index.suggest(substring, keep=key2ph.__contains__,
+                                                   extra=overlay.keys() if overlay is not None else ())
+                    if suggestions:
+                        print("\n" + format_suggestions(suggestions))
+                buffer += char
+                print(f"\rBuffer: {buffer}", end='', flush=True)
+                continue
 
-        if char == ' ':
-            # Split the buffer into English + number pairs, adding ';' to the regex
-            pairs = re.findall(r'([a-zA-Z;/`]+)(\d+)?', buffer)
-
-            for pair in pairs:
-                english, num_str = pair
-                num = int(num_str) if num_str else 1  # Default to 1 if no number is provided
-
-                if '/' in english:
-                    # Handle logic when '/' is present
-                    substring = english.replace('/', '')
-                    matched_keys = [key for key in keys2word if key == substring]
-                    if matched_keys:
-                        options = []
-                    for key in matched_keys:
-                        for phrase in keys2word[key]:
-                            options.append((key, phrase))
-                    for idx, (key, option) in enumerate(options, start=1):
-                        if num == idx:
-                            output_buffer += ''.join(option)
-                # Check if ';' exists in the current 'english' part
-                elif '`' in english:
-                    # Handle logic when '/' is present
-                    substring = english.replace('`', '')
-                    if len(substring) > 0:
-                        matched_keys = [key for key in keys2word if key.startswith(substring)]
-                        if matched_keys:
-                            options = []
-                        for key in matched_keys:
-                            for phrase in keys2word[key]:
-                                options.append((key, phrase))
-                        for idx, (key, option) in enumerate(options, start=1):
-                            if num == idx:
-                                output_buffer += ''.join(option)
-                # Check if ';' exists in the current 'english' part
-                elif ';' in english:
-                    # Handle logic when ';' is present
-                    substring = english.replace(';', '')
-                    matched_keys = [key for key in key2ph if key.startswith(substring)]
-                    if matched_keys:
-                        options = []
-                    for key in matched_keys:
-                        for number, phrase in key2ph[key]:
-                            options.append((key, number, phrase))
-                    for idx, (key, number, option) in enumerate(options, start=1):
-                        if num == idx:
-                            output_buffer += ''.join(option)
-                else:
-                    # Old logic when ';' is not present
-                    if english in key2ph:
-                        matched_phrase = next(
-                            (phrase_list for number, phrase_list in key2ph[english] if number == num),
-                            None
-                        )
-                        if matched_phrase:
-                            output_buffer += ''.join(matched_phrase)
-                    else:
-                        # 當 key2ph 中無法找到英文單字時，啟用 3 字元分割邏輯
-                        current_pos = 0
-                        buffer2 = english
-                        while len(buffer2[current_pos:]) >= 3:
-                            left_chars = buffer2[current_pos:current_pos + 3]
-                            mem_index = left_chars[:2]  # 前兩個字元作為 mem2char 的索引
-                            offset_char = left_chars[2]  # 第三個字元表示偏移量
-
-                            # 偏移量轉換：從 'a' 開始的索引
-                            if 'a' <= offset_char <= 'z':
-                                offset = ord(offset_char) - ord('a')  # 偏移量
-                                if mem_index in mem2char and offset < len(mem2char[mem_index]):
-                                    result_char = mem2char[mem_index][offset]  # 查找對應字元
-                                    output_buffer += result_char  # 加入輸出緩衝
-                                else:
-                                    output_buffer += '?'  # 無效索引或偏移時用占位符
-                            else:
-                                output_buffer += '?'  # 非 'a'-'z' 範圍字元顯示占位符
-
-                            current_pos += 3  # 更新處理位置
-                            english2 = buffer2[current_pos:]
-                            if english2 in key2ph:
-                                matched_phrase = next(
-                                    (phrase_list for number, phrase_list in key2ph[english2] if number == num),
-                                    None
-                                )
-                                if matched_phrase:
-                                    output_buffer += ''.join(matched_phrase)
-                                pos += current_pos
-                                break
-                        pos += current_pos
-                    
-                # 當沒有提供數字時，處理 raw_chars
-                if not num_str:
-                    raw_chars = english
-                    groups = [raw_chars[i:i+3] for i in range(0, len(raw_chars), 3)]
-                    left_chars = ''
-                    for group in groups:
-                        if len(group) == 3:
-                            key = group[:2]  # Extract the first two characters as the key
-                            index = ord(group[2]) - ord('a')  # Convert the third character to an index (0-25)
-                            if key in mem2char and 0 <= index < len(mem2char[key]):
-                                output_buffer += mem2char[key][index]
-                        else:
-                            left_chars += group
-                    
-                    # 嘗試在 key2ph 中匹配剩餘字符
-                    if left_chars in key2ph:
-                        for _, words in key2ph[left_chars]:
-                            output_buffer += ''.join(words)
-
-            print(f"\nOutput: {output_buffer}")
-            buffer = ''
-            output_buffer = ''
-            num = 0
-            pos = 0
-            print(hint_string_1)
-            continue
+            if char == '`':
+                substring = buffer[pos:]
+                if len(substring) == 0:
+                    continue;
+                options, text = candidates('`', substring)
+                if options:
+                    print("\n")
+                    print(text)
+                elif lime_index:
+                    suggestions = lime_index.suggest(substring, keep=keys2word.__contains__)
+                    if suggestions:
+                        print("\n" + format_suggestions(suggestions))
+
+                buffer += char
+                print(f"\rBuffer: {buffer}", end='', flush=True)
+                continue
             
-        if char == '\t':
-            print(hint_string_1)
-            continue
+            if char == '/':
+                substring = buffer[pos:]
+                options, text = candidates('/', substring)
+                if options:
+                    print("\n")
+                    print(text)
+                elif lime_index and substring:
+                    suggestions = lime_index.suggest(substring, keep=keys2word.__contains__)
+                    if suggestions:
+                        print("\n" + format_suggestions(suggestions))
+
+                buffer += char
+                print(f"\rBuffer: {buffer}", end='', flush=True)
+                continue
 
-        if char.isdigit():
-            num = num * 10 + int(char)
-            buffer += char
-            pos = len(buffer)
-            continue
+            if char == '?':  # 以助記關鍵字查字與三碼，例如 fox? 列出 狐、狸
+                substring = buffer[pos:]
+                if not substring:
+                    continue
+                options, text = candidates('?', substring)
+                if options:
+                    print("\n")
+                    print(text)
+                elif keywords is None:
+                    print(f"\n{KEYWORD_FILE} not found; run mem2tksm.py first.")
+                buffer += char
+                print(f"\rBuffer: {buffer}", end='', flush=True)
+                continue
+
+            if char == ' ':
+                max_key_len = max(ph_prefix.longest, overlay.longest if overlay else 0)
+                segmenter = None
+                if segment == 'optimal':
+                    segmenter = Segmenter(key2ph, mem2char, keys2word, max(max_key_len, lime_prefix.longest))
+                output_buffer = commit_buffer(buffer, key2ph, mem2char, lambda mode, substring: candidates(mode, substring)[0],
+                                              max_key_len, segmenter)
+                emit(output_buffer)
+                show_associations(output_buffer)
+                buffer = ''
+                output_buffer = ''
+                num = 0
+                pos = 0
+                print(hint_string_1)
+                continue
+            
+            if char == '\t':
+                print(hint_string_1)
+                continue
 
-        if ord(char) in (8, 127):  # Backspace key
-            if buffer:
-                buffer = buffer[:-1]
-                pos = min(pos, len(buffer))
+            if char == '=':  # 切換候選字集篩選
+                try:
+                    select_view(next_filter(charset_filter))
+                except OSError as e:
+                    print(f"\nCharset filter unavailable: {e}")
+                else:
+                    print(f"\nCharset filter: {charset_filter}")
                 print(f"\rBuffer: {buffer}", end='', flush=True)
-            continue
+                continue
 
-        buffer += char
-        num = 0
+            if char.isdigit():
+                num = num * 10 + int(char)
+                buffer += char
+                pos = len(buffer)
+                continue
+
+            if ord(char) in (8, 127):  # Backspace key
+                if buffer:
+                    buffer = buffer[:-1]
+                    pos = min(pos, len(buffer))
+                    print(f"\rBuffer: {buffer}", end='', flush=True)
+                continue
+
+            buffer += char
+            num = 0
+            usage[buffer[pos:]] += 1
+
+            if auto_commit and pos == 0:
+                committed = auto_commit_text(buffer)
+                if committed is not None:
+                    emit(committed)
+                    show_associations(committed)
+                    buffer = ''
+                    continue
 
-        if buffer[pos:] in key2ph:
-            options = key2ph[buffer[pos:]]
-            print("\nOptions:")
-            for idx, (number, option) in enumerate(options, start=1):
-                print(f"{number}: {''.join(option)}")
-            print(f"\rBuffer: {buffer}", end='', flush=True)
+            if buffer[pos:] in key2ph:
+                options = key2ph[buffer[pos:]]
+                print("\nOptions:")
+                for idx, (number, option) in enumerate(options, start=1):
+                    print(f"{number}: {''.join(option)}")
+                print(f"\rBuffer: {buffer}", end='', flush=True)
 
-        current_pos = pos  # 使用另一個變數追蹤當前處理位置
+            current_pos = pos  # 使用另一個變數追蹤當前處理位置
 
-        # 迴圈處理每 3 個字元，直到剩餘不足 3 個字元
-        while len(buffer[current_pos:]) >= 3:
-            # 提取左側三個字元
-            left_chars = buffer[current_pos:current_pos + 3]
-            mem_index = left_chars[:2]  # 前兩個字元作為 mem2char 的索引
-            offset_char = left_chars[2]  # 第三個字元表示偏移量
+            # 迴圈處理每 3 個字元，直到剩餘不足 3 個字元
+            while len(buffer[current_pos:]) >= 3:
+                # 提取左側三個字元
+                left_chars = buffer[current_pos:current_pos + 3]
+                mem_index = left_chars[:2]  # 前兩個字元作為 mem2char 的索引
+                offset_char = left_chars[2]  # 第三個字元表示偏移量
             
-            # 偏移量轉換：從 'a' 開始的索引
-            if 'a' <= offset_char <= 'z':
-                offset = ord(offset_char) - ord('a')  # 偏移量
-                if mem_index in mem2char and offset < len(mem2char[mem_index]):
-                    result_char = mem2char[mem_index][offset]  # 查找對應字元
-                    print(result_char, end='')  # 直接輸出結果字元
+                # 偏移量轉換：從 'a' 開始的索引
+                if 'a' <= offset_char <= 'z':
+                    offset = ord(offset_char) - ord('a')  # 偏移量
+                    if mem_index in mem2char and offset < len(mem2char[mem_index]):
+                        result_char = mem2char[mem_index][offset]  # 查找對應字元
+                        print(result_char, end='')  # 直接輸出結果字元
+                    else:
+                        print("?", end='')  # 無效索引或偏移時顯示占位符
                 else:
-                    print("?", end='')  # 無效索引或偏移時顯示占位符
-            else:
-                print("?", end='')  # 非 'a'-'z' 範圍字元顯示占位符
+                    print("?", end='')  # 非 'a'-'z' 範圍字元顯示占位符
             
-            current_pos += 3  # 更新處理位置
-
-        # 處理剩餘不足 3 個字元的情況（執行舊邏輯）
-        if len(buffer[current_pos:]) == 2:
-            print("\n## ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ")
-            if buffer[current_pos:] in mem2char:
-                result_chars = ''.join(mem2char[buffer[current_pos:]])
-                print(f"{buffer[current_pos:]} {result_chars}")
-
-        print(f"\nBuffer: {buffer}", end='', flush=True)
+                current_pos += 3  # 更新處理位置
+
+            # 處理剩餘不足 3 個字元的情況（執行舊邏輯）
+            if len(buffer[current_pos:]) == 2:
+                print("\n## ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ")
+                if buffer[current_pos:] in mem2char:
+                    result_chars = ''.join(mem2char[buffer[current_pos:]])
+                    print(f"{buffer[current_pos:]} {result_chars}")
+
+            print(f"\nBuffer: {buffer}", end='', flush=True)
+
+            if buffer[current_pos:] in key2ph:
+                options = key2ph[buffer[current_pos:]]
+                print("\nOptions:")
+                for idx, (number, option) in enumerate(options, start=1):
+                    print(f"{number}: {''.join(option)}")
+                print(f"\rBuffer: {buffer}", end='', flush=True)
+    finally:
+        if prefetcher:
+            prefetcher.stop()
 
-        if buffer[current_pos:] in key2ph:
-            options = key2ph[buffer[current_pos:]]
-            print("\nOptions:")
-            for idx, (number, option) in enumerate(options, start=1):
-                print(f"{number}: {''.join(option)}")
-            print(f"\rBuffer: {buffer}", end='', flush=True)
 
+def start_tables(lime_file='cuf_keyboard_m01.lime', mem_file='tmp_tksm_words.txt'):
+    """先載入最小的三碼表，再啟動背景執行緒載入 lime 與詞組表。回傳 (mem2char, loader)。"""
+    if os.path.exists(mem_file):
+        mem2char = parse_mem_file(mem_file)
+        print("Parsed mem2char data loaded.")
+    else:
+        mem2char = {}
 
-if __name__ == "__main__":
+    word_files = [file_name for file_name in os.listdir() if re.match(r'word.*\.txt$', file_name)]
+    loader = TableLoader(lime_file, word_files, mem2char)
+    loader.start()
+    return mem2char, loader
+
+def memory_report(lime_file='cuf_keyboard_m01.lime', mem_file='tmp_tksm_words.txt'):
+    """在前景依序執行所有載入步驟並以 tracemalloc 量測，回傳每張表與每個載入步驟的報告。"""
+    import mem2tksm
+    from memreport import MemoryProfiler, format_report
+
+    profiler = MemoryProfiler()
+    mem2char = profiler.measure('parse_mem_file', parse_mem_file, mem_file) if os.path.exists(mem_file) else {}
+    word_files = [file_name for file_name in os.listdir() if re.match(r'word.*\.txt$', file_name)]
+    loader = TableLoader(lime_file, word_files, mem2char, profiler=profiler)
+    loader.run()
+    tables = loader.snapshot.tables()
+    if os.path.exists(mem2tksm.PINYIN_CIN):
+        tables['pinyin_map'] = profiler.measure('mem2tksm.load_cin', mem2tksm.load_cin, mem2tksm.PINYIN_CIN)
+    return format_report(profiler, tables)
+
+def main(read_key=getch, auto_commit=False, charset_filter='all', associate=True, outputs=(), segment='greedy'):
     lime_file = 'cuf_keyboard_m01.lime'
     if not os.path.exists(lime_file):
         print(f"Error: {lime_file} not found.")
         exit(1)
 
-    word2pinyin, keys2word = parse_lime_file(lime_file)
-    key2ph = {}
-    for file_name in os.listdir():
-        if re.match(r'word.*\.txt$', file_name):
-            parse_word_file(file_name, word2pinyin, key2ph)
-
-    mem_file = 'tmp_tksm_words.txt'
-    if os.path.exists(mem_file):
-        mem2char = parse_mem_file(mem_file)
-        print("Parsed mem2char data loaded.")
-    else:
-        mem2char = {}
+    try:
+        writers = [OutputWriter(open_sink(spec)) for spec in outputs]
+    except (OSError, ValueError) as e:
+        print(f"Error: --output: {e}")
+        exit(2)
+    for writer in writers:
+        writer.start()
+
+    mem2char, loader = start_tables(lime_file)
+    keywords = KeywordIndex() if os.path.exists(KEYWORD_FILE) else None
+    overlay = UserOverlay.load() if os.path.exists(USER_FILE) else None
+    try:
+        input_loop({}, mem2char, {}, loader=loader, read_key=read_key, auto_commit=auto_commit,
+                   charset_filter=charset_filter, associate=associate, keywords=keywords, outputs=writers,
+                   overlay=overlay, segment=segment)
+    finally:
+        for spec, writer in zip(outputs, writers):
+            writer.close()
+            print(f"Output {spec}: {writer.stats()}")
 
-    input_loop(key2ph, mem2char, keys2word)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TriKeySndMem input loop.")
+    parser.add_argument('--auto-commit', action='store_true',
+                        help="commit unambiguous three-key codes and phrase keys as soon as they are typed")
+    parser.add_argument('--charset', choices=list(FILTERS), default='all',
+                        help="initial candidate filter; press = to cycle through the filters")
+    parser.add_argument('--no-associate', action='store_true',
+                        help="do not suggest associated phrases after each commit")
+    parser.add_argument('--output', action='append', default=[], metavar='KIND:PATH',
+                        help="also send committed text to file:PATH, fifo:PATH, socket:PATH or clipboard[:PATH]; "
+                             "may be repeated")
+    parser.add_argument('--segment', choices=['greedy', 'optimal'], default='greedy',
+                        help="how to split unmarked segments on commit: the original left-to-right rules, or the "
+                             "best mix of three-key codes, phrase keys and lime keys")
+    parser.add_argument('--memory-report', action='store_true',
+                        help="load every table under tracemalloc, print per-table and per-loader memory use and exit")
+    args = parser.parse_args()
+    if args.memory_report:
+        print(memory_report())
+        sys.exit(0)
+    main(auto_commit=args.auto_commit, charset_filter=args.charset, associate=not args.no_associate,
+         outputs=args.output, segment=args.segment)
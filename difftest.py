@@ -0,0 +1,212 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import cuf1
+import reference
+from codespace import EMPTY_SLOT
+from segment import Segmenter
+from session import END_KEY, read_session
+
+# Differential test of cuf1.input_loop against reference.py.
+#
+# Each worker process loads the dictionaries twice, once with the frozen
+# reference parsers and once through cuf1.TableLoader (compact tables and
+# indexes), then runs key streams through both engines and compares the
+# committed text.  Streams are generated from the table keys with markers,
+# numbers and backspaces mixed in, or taken from recorded sessions.  A
+# diverging stream is shrunk by deleting chunks of keys while the engines
+# still disagree, so the report shows a short reproduction.
+#
+# The optimal segmentation (--segment optimal) has no reference engine; it
+# is checked against fixed small tables and expected commits instead.
+
+LIME_FILE = 'cuf_keyboard_m01.lime'
+MEM_FILE = 'tmp_tksm_words.txt'
+SKIPPED_KEYS = '=\x12'  # 篩選切換與重新載入不在參考實作中，錄製檔中的這些鍵會先移除
+MARKERS = ';`/'
+
+# 最佳切分的固定測試表：hfe 為三碼，其餘為詞組鍵與 lime 鍵
+SEGMENT_TABLES = (
+    {'zg': [(1, ['中國'])]},
+    {'hf': [EMPTY_SLOT] * 4 + ['火'] + [EMPTY_SLOT] * 21},
+    {'hf': ['嚄'], 'elf': ['影'], 'lf': ['爾'], 'o': ['歐', '喔'], 'z': ['資'], 'g': ['個', '阿']},
+)
+SEGMENT_CASES = [  # (字母, 編號, 應上屏的文字)
+    ('hfelfo', None, '火爾歐'),  # 不是 hf + elf + o
+    ('hfelf', None, '火爾'),  # 成本相同時以三碼優先
+    ('hfehfe', None, '火火'),
+    ('zg', None, '中國'),
+    ('zg', 1, '中國'),
+    ('zg', 2, ''),  # zg 沒有第 2 個詞組，不改成 z + g 的第 2 個字
+    ('o', 2, '喔'),
+    ('hfeo', 2, '火喔'),
+    ('hfe', None, '火'),
+]
+
+tables = None  # 每個 worker 載入一次：(參考表, 快速引擎的 TableStore, 產生按鍵用的鍵)
+prefetch = False
+
+def init_worker(lime_file, mem_file, use_prefetch):
+    global tables, prefetch
+    word_files = sorted(file_name for file_name in os.listdir() if re.match(r'word.*\.txt$', file_name))
+    if not os.path.exists(mem_file):
+        mem_file = None
+    key2ph, mem2char, keys2word = reference.load_tables(lime_file, word_files, mem_file)
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader = cuf1.TableLoader(lime_file, word_files, cuf1.parse_mem_file(mem_file) if mem_file else {})
+        loader.run()
+    codes = [block + chr(ord('a') + offset) for block, row in mem2char.items()
+             for offset, char in enumerate(row) if char != EMPTY_SLOT]
+    tables = (reference.ReferenceEngine(key2ph, mem2char, keys2word), loader.store,
+              (list(key2ph), list(keys2word), codes))
+    prefetch = use_prefetch
+
+def table_mismatches():
+    """比對快速引擎的表與參考表的內容，回傳不一致的說明。"""
+    engine, store, _ = tables
+    snapshot = store.snapshot
+    problems = []
+    for name, expected, actual in (('key2ph', engine.key2ph, snapshot.key2ph),
+                                   ('keys2word', engine.keys2word, snapshot.keys2word)):
+        if list(expected) != list(actual):
+            problems.append(f"{name}: keys differ ({len(expected)} vs {len(actual)})")
+            continue
+        for key in expected:
+            if [tuple(entry) for entry in expected[key]] != [tuple(entry) for entry in actual[key]]:
+                problems.append(f"{name}[{key!r}]: {expected[key]!r} != {list(actual[key])!r}")
+    for block, row in engine.mem2char.items():
+        if tuple(row) != tuple(snapshot.mem2char.get(block, ())):
+            problems.append(f"mem2char[{block!r}] differs")
+    return problems
+
+def segment_mismatches():
+    """以 SEGMENT_TABLES 檢查 segment.Segmenter，回傳不符預期的說明。"""
+    key2ph, mem2char, keys2word = SEGMENT_TABLES
+    segmenter = Segmenter(key2ph, mem2char, keys2word, max(map(len, [*key2ph, *keys2word])))
+    problems = []
+    for english, num, expected in SEGMENT_CASES:
+        actual = segmenter.text(english, num)
+        if actual != expected:
+            problems.append(f"segment {english!r} #{num}: expected {expected!r}, got {actual!r} "
+                            f"{segmenter.parse(english, num)!r}")
+    return problems
+
+def random_keys(rng, length):
+    """由表中的鍵組出 length 段左右的按鍵序列。"""
+    ph_keys, lime_keys, codes = tables[2]
+    keys = []
+    for _ in range(length):
+        pool = rng.choice([pool for pool in (ph_keys, lime_keys, codes) if pool] or [['abc']])
+        word = rng.choice(pool)
+        if rng.random() < 0.3:
+            word = word[:rng.randint(0, len(word))]  # 前綴
+        if rng.random() < 0.1:
+            word += rng.choice('abcdefghijklmnopqrstuvwxyz')
+        keys.append(word)
+        if rng.random() < 0.4:
+            keys.append(rng.choice(MARKERS))
+        if rng.random() < 0.5:
+            keys.append(str(rng.randint(1, 12)))
+        if rng.random() < 0.1:
+            keys.append('\x7f' * rng.randint(1, 3))
+        if rng.random() < 0.05:
+            keys.append(rng.choice('\t~'))
+        if rng.random() < 0.4:
+            keys.append(' ')
+    keys.append(' ')
+    return ''.join(keys)
+
+def run_fast(keys):
+    """以 cuf1.input_loop 執行按鍵序列，回傳每次上屏的文字；例外以 'error: ...' 記錄。"""
+    stream = iter(keys + END_KEY)
+
+    def read_key():
+        for key in stream:
+            return key
+        raise EOFError  # 例如 ~ 分頁時按鍵已用完
+
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            cuf1.input_loop({}, None, {}, store=tables[1], read_key=read_key, prefetch=prefetch, associate=False)
+    except EOFError:
+        pass
+    except Exception as e:
+        return re.findall(r'^Output: (.*)$', out.getvalue(), re.M) + [f"error: {type(e).__name__}: {e}"]
+    return re.findall(r'^Output: (.*)$', out.getvalue(), re.M)
+
+def run_reference(keys):
+    try:
+        return tables[0].run(keys)
+    except Exception as e:
+        return [f"error: {type(e).__name__}: {e}"]
+
+def diverges(keys):
+    return run_reference(keys) != run_fast(keys)
+
+def minimize(keys):
+    """反覆刪除一段按鍵，只要兩個引擎仍不一致就保留刪除，直到無法再縮短。"""
+    chunk = len(keys) // 2
+    while chunk >= 1:
+        start = 0
+        while start < len(keys):
+            candidate = keys[:start] + keys[start + chunk:]
+            if candidate and diverges(candidate):
+                keys = candidate
+            else:
+                start += chunk
+        chunk //= 2
+    return keys
+
+def check(case):
+    """case 為 (名稱, 種子或按鍵, length)；一致時回傳 None，否則回傳縮短後的重現資料。"""
+    name, source, length = case
+    keys = random_keys(random.Random(source), length) if isinstance(source, int) else source
+    if not diverges(keys):
+        return None
+    keys = minimize(keys)
+    return name, keys, run_reference(keys), run_fast(keys)
+
+def session_keys(path):
+    return ''.join(key for _, key in read_session(path) if key not in SKIPPED_KEYS)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cuf1.input_loop with the reference implementation.")
+    parser.add_argument('--cases', type=int, default=1000, help="number of random key streams")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first random stream")
+    parser.add_argument('--length', type=int, default=8, help="segments per random stream")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument('--session', action='append', default=[], help="also replay a recorded session file")
+    parser.add_argument('--prefetch', action='store_true', help="run the fast engine with its prefetch thread")
+    parser.add_argument('--limit', type=int, default=10, help="divergences to print")
+    args = parser.parse_args()
+
+    if not os.path.exists(LIME_FILE):
+        print(f"Error: {LIME_FILE} not found.", file=sys.stderr)
+        sys.exit(2)
+
+    cases = [(f"session {path}", session_keys(path), 0) for path in args.session]
+    cases += [(f"seed {seed}", seed, args.length) for seed in range(args.seed, args.seed + args.cases)]
+
+    with ProcessPoolExecutor(args.jobs, initializer=init_worker, initargs=(LIME_FILE, MEM_FILE, args.prefetch)) as pool:
+        problems = segment_mismatches() + pool.submit(table_mismatches).result()
+        failures = [result for result in pool.map(check, cases, chunksize=max(1, len(cases) // (8 * args.jobs)))
+                    if result is not None]
+
+    for problem in problems[:args.limit]:
+        print(f"mismatch: {problem}")
+    for name, keys, expected, actual in failures[:args.limit]:
+        print(f"{name}: keys {keys!r}")
+        print(f"  reference: {expected!r}")
+        print(f"  cuf1:      {actual!r}")
+    print(f"{len(cases)} streams, {len(failures)} divergent, {len(problems)} table or segmentation mismatches")
+    sys.exit(1 if failures or problems else 0)
+
+if __name__ == "__main__":
+    main()
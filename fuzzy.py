@@ -0,0 +1,81 @@
+from itertools import combinations
+
+# Symmetric-deletion index for typo-tolerant key lookup.
+#
+# Every key is stored under all strings obtained by deleting up to
+# max_distance characters from it.  A query generates the same deletions of
+# the typed key and probes the dict, so only keys sharing a deletion variant
+# are ever compared; the edit distance is computed for those few candidates.
+
+def deletions(key, max_distance):
+    """產生 key 刪去 0..max_distance 個字元後的所有字串。"""
+    variants = {key}
+    for count in range(1, min(max_distance, len(key)) + 1):
+        for positions in combinations(range(len(key)), count):
+            variants.add(''.join(c for i, c in enumerate(key) if i not in positions))
+    return variants
+
+def edit_distance(a, b, limit):
+    """Damerau-Levenshtein (相鄰交換算一次) 距離，超過 limit 時提早回傳 limit + 1。"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(prev[j] + 1, current[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], prev2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        prev2, prev = prev, current
+    return prev[-1]
+
+class DeleteIndex:
+    """以刪除變體為索引的鍵位集合，用於找出編輯距離 1–2 以內的相近鍵。"""
+
+    def __init__(self, keys, max_distance=2):
+        self.max_distance = max_distance
+        self.order = {}
+        self.index = {}
+        for key in keys:
+            if key in self.order:
+                continue
+            self.order[key] = len(self.order)
+            for variant in deletions(key, max_distance):
+                self.index.setdefault(variant, []).append(key)
+
+    def __len__(self):
+        return len(self.order)
+
+    def suggest(self, key, limit=10, max_distance=None, keep=None, extra=()):
+        """回傳 [(距離, 鍵), ...]，依距離與原表順序排序，不含 key 本身。
+
+        keep(鍵) 為假的鍵略去（例如字集篩選後已不存在的鍵）；extra 為不在索引中、
+        逐一比對的額外鍵（例如使用者新增的鍵），排在同距離的索引鍵之後。
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        candidates = set()
+        for variant in deletions(key, max_distance):
+            candidates.update(self.index.get(variant, ()))
+        extra_order = {}
+        for candidate in extra:
+            if candidate not in self.order:
+                extra_order.setdefault(candidate, len(self.order) + len(extra_order))
+        candidates.update(extra_order)
+        candidates.discard(key)
+
+        results = []
+        for candidate in candidates:
+            if keep is not None and not keep(candidate):
+                continue
+            distance = edit_distance(key, candidate, max_distance)
+            if distance <= max_distance:
+                results.append((distance, self.order.get(candidate, extra_order.get(candidate)), candidate))
+        results.sort()
+        return [(distance, candidate) for distance, _, candidate in results[:limit]]
+
+def format_suggestions(suggestions):
+    return "Did you mean: " + ", ".join(key for _, key in suggestions)
@@ -0,0 +1,50 @@
+import re
+
+from tableconv import TkbTable, write_tkb
+
+# Mnemonic keyword index: keyword -> (code, char) for every character placed
+# from mem*.txt, written by mem2tksm.py next to tmp_tksm_words.txt.  It is a
+# compiled tkb table (sorted records with an offsets index), so lookups
+# bisect the memory-mapped file instead of loading it.
+
+KEYWORD_FILE = "tmp_tksm_keywords.tkb"
+KEYWORD_LIMIT = 50  # 一次查詢最多列出的字數
+
+def write_keyword_index(words_map, path=KEYWORD_FILE):
+    """由 mem2tksm 的 words_map（需已由 generate_tksm_words 填入 'code'）寫出關鍵字索引。"""
+    pairs = ((data['keyword'].lower(), f"{data['code']}\t{char}")
+             for char, data in words_map.items()
+             if re.match(r'^[a-z]{3}$', data.get('code', '')))
+    write_tkb(pairs, path)
+    return path
+
+class KeywordIndex:
+    """以前綴查詢助記關鍵字；結果依關鍵字排序，同一關鍵字內保留 mem*.txt 中的順序。"""
+
+    def __init__(self, path=KEYWORD_FILE):
+        self.table = TkbTable(path)
+
+    def __len__(self):
+        return len(self.table)
+
+    def keywords(self):
+        """所有不重複的關鍵字，依排序。"""
+        previous = None
+        for i in range(len(self.table)):
+            keyword = self.table.key_at(i)
+            if keyword != previous:
+                yield keyword
+                previous = keyword
+
+    def search(self, prefix, limit=KEYWORD_LIMIT):
+        """回傳 [(keyword, code, char), ...]。"""
+        results = []
+        for keyword, value in self.table.prefix(prefix.lower()):
+            if len(results) >= limit:
+                break
+            code, char = value.split('\t')
+            results.append((keyword, code, char))
+        return results
+
+    def close(self):
+        self.table.close()
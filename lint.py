@@ -0,0 +1,357 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import mem2tksm
+from codespace import EMPTY_SLOT, KEYORDER
+
+# Dictionary linter for pinyin.cin, *.lime, word*.txt, mem*.txt and
+# tmp_tksm_words.txt.  Each file is checked in its own worker process and
+# every problem becomes a structured diagnostic instead of an ad-hoc print.
+# The mem*.txt and word*.txt workers also return their parsed entries; the
+# loaders merge those files into one table, so duplicates, code conflicts
+# and phrase renumbering are checked afterwards across all of them, in the
+# order the files are given.
+
+LIME_FILE = 'cuf_keyboard_m01.lime'
+
+_initials = {}
+
+def diagnostic(file_name, line_no, severity, code, message):
+    return {'file': file_name, 'line': line_no, 'severity': severity, 'code': code, 'message': message}
+
+def cin_initials():
+    """pinyin.cin 中每個字的拼音首字母（mem*.txt 的第一碼），每個工作行程只載入一次。"""
+    if 'cin' not in _initials:
+        _initials['cin'] = mem2tksm.load_cin(mem2tksm.PINYIN_CIN) if os.path.exists(mem2tksm.PINYIN_CIN) else {}
+    return _initials['cin']
+
+def lime_initials():
+    """lime 檔推得的 word2pinyin（word*.txt 未指定鍵位時使用）。"""
+    if 'lime' not in _initials:
+        from cuf1 import parse_lime_file
+        _initials['lime'] = parse_lime_file(LIME_FILE)[0] if os.path.exists(LIME_FILE) else {}
+    return _initials['lime']
+
+def lint_cin(file_name):
+    results = []
+    seen = {}
+    in_chardef = False
+    begin_line = None
+    with open(file_name, encoding='utf-8') as file:
+        for line_no, line in enumerate(file, start=1):
+            line = line.strip()
+            if line == "%chardef begin":
+                in_chardef = True
+                begin_line = line_no
+                continue
+            if line == "%chardef end":
+                in_chardef = False
+                begin_line = None
+                continue
+            if not in_chardef or not line:
+                continue
+            parts = line.split()
+            if len(parts) != 2:
+                results.append(diagnostic(file_name, line_no, 'error', 'malformed',
+                                          f"expected 'key value', got {line!r}"))
+                continue
+            key, value = parts
+            if not re.match(r'^[a-z]+[1-5]?$', key):
+                results.append(diagnostic(file_name, line_no, 'warning', 'bad-key', f"unusual pinyin key {key!r}"))
+            if (key, value) in seen:
+                results.append(diagnostic(file_name, line_no, 'warning', 'duplicate',
+                                          f"'{key} {value}' already defined on line {seen[key, value]}"))
+            else:
+                seen[key, value] = line_no
+    if begin_line is not None:
+        results.append(diagnostic(file_name, begin_line, 'error', 'unterminated', "%chardef begin without %chardef end"))
+    return results
+
+def lint_lime(file_name):
+    results = []
+    seen = {}
+    with open(file_name, encoding='utf-8') as file:
+        for line_no, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                results.append(diagnostic(file_name, line_no, 'info', 'blank', "blank line"))
+                continue
+            parts = line.split(',')
+            if len(parts) < 2 or not parts[0] or not parts[1]:
+                results.append(diagnostic(file_name, line_no, 'error', 'malformed', f"expected 'key,word', got {line!r}"))
+                continue
+            key, word = parts[0], parts[1]
+            if not re.match(r'^[a-z]+$', key):
+                results.append(diagnostic(file_name, line_no, 'warning', 'bad-key', f"unusual key {key!r}"))
+            if (key, word) in seen:
+                results.append(diagnostic(file_name, line_no, 'warning', 'duplicate',
+                                          f"'{key},{word}' already defined on line {seen[key, word]}"))
+            else:
+                seen[key, word] = line_no
+    return results
+
+def lint_word(file_name):
+    """依 cuf1.parse_word_file 的規則檢查格式，回傳 (診斷, [(行號, 鍵, 編號, 詞組)])；編號由 check_words 跨檔檢查。"""
+    results = []
+    word2pinyin = lime_initials()
+    entries = []
+    with open(file_name, encoding='utf-8') as file:
+        for line_no, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('"'):
+                match = re.match(r'"(.*?)"\s*(.*)', line)
+                if not match:
+                    results.append(diagnostic(file_name, line_no, 'error', 'malformed', f"unterminated quote in {line!r}"))
+                    continue
+                phrase, rest = match.groups()
+            else:
+                parts = re.split(r'[\s\t]+', line, maxsplit=1)
+                phrase, rest = parts[0], parts[1] if len(parts) > 1 else ''
+
+            num, key = -1, None
+            if rest.isdigit():
+                num = int(rest)
+            elif re.match(r'^([a-zA-Z]+)(\d*)$', rest):
+                match = re.match(r'^([a-zA-Z]+)(\d*)$', rest)
+                key = match[1]
+                num = int(match[2]) if match[2] else -1
+            elif rest:
+                results.append(diagnostic(file_name, line_no, 'error', 'malformed',
+                                          f"cannot parse key/number {rest!r}, line is keyed from pinyin"))
+
+            if not key:
+                missing = [char for char in phrase if not word2pinyin.get(char)]
+                if len(missing) == len(phrase):
+                    results.append(diagnostic(file_name, line_no, 'warning', 'unknown-initial',
+                                              f"no pinyin initial for {phrase!r}, falls back to key 'v'"))
+                    key = 'v'
+                else:
+                    if missing:
+                        results.append(diagnostic(file_name, line_no, 'warning', 'unknown-initial',
+                                                  f"no pinyin initial for {''.join(missing)!r} in {phrase!r}"))
+                    key = ''.join(word2pinyin.get(char, '') for char in phrase)
+
+            entries.append((line_no, key, num, phrase))
+    return results, entries
+
+def lint_mem(file_name):
+    """檢查 mem*.txt 的格式、第三碼與未知聲母，回傳 (診斷, [(行號, 字, 關鍵字, 第三碼, 聲母)])。
+
+    沒有 <x> 的字第三碼為 None，聲母不明時為 None；重複字與三碼衝突由 check_mem 跨檔檢查。
+    """
+    results = []
+    pinyin_map = cin_initials()
+    entries = []
+    keyword = None
+    with open(file_name, encoding='utf-8') as file:
+        for line_no, raw in enumerate(file, start=1):
+            line = raw.rstrip()
+            if not line or (line.startswith("(") and line.endswith(")")):
+                continue
+            if not line.startswith(" "):
+                keyword = line.strip()
+                if not re.match(r'^[a-z]{2,}', keyword):
+                    results.append(diagnostic(file_name, line_no, 'error', 'bad-keyword',
+                                              f"keyword {keyword!r} needs at least two lowercase letters"))
+                    keyword = ''
+                continue
+            if keyword is None:
+                results.append(diagnostic(file_name, line_no, 'error', 'malformed', "character line before any keyword"))
+                continue
+            if not keyword:
+                continue  # 已回報的無效關鍵字
+            if line.startswith("  "):
+                placed = [(match[1], match[2]) for match in re.finditer(r"(\S)(?:<([^>]+)>)?", line.strip())]
+            else:
+                placed = [(char, keyword[1:2]) for char in line.strip()]
+            for char, third_code in placed:
+                if third_code is not None and (len(third_code) != 1 or third_code not in KEYORDER):
+                    results.append(diagnostic(file_name, line_no, 'error', 'bad-code',
+                                              f"third code <{third_code}> for {char!r} is not a single a-z key"))
+                    continue
+                initial = pinyin_map[char][0] if char in pinyin_map else None
+                if initial is None:
+                    results.append(diagnostic(file_name, line_no, 'warning', 'unknown-initial',
+                                              f"{char!r} has no pinyin in {mem2tksm.PINYIN_CIN}"))
+                entries.append((line_no, char, keyword, third_code, initial))
+    return results, entries
+
+def check_mem(file_entries):
+    """依 mem2tksm 的規則跨所有 mem*.txt 編碼：重複字、自動分配的第三碼用盡，以及三碼衝突。
+
+    沒有 <x> 的字依序取 (首碼, 次碼) 尚未分配的第三碼，與 mem2tksm.load_mem_txt 相同，
+    所以自動分配的碼也會與其他字的碼比對（未使用 --optimize 時的結果）。
+    """
+    results = []
+    unused = {}  # 關鍵字前兩碼 -> 尚未自動分配的第三碼
+    chars = {}  # 字 -> 第一次出現的位置
+    codes = {}  # 三碼 -> (字, 位置)
+    for file_name, entries in file_entries:
+        for line_no, char, keyword, third_code, initial in entries:
+            where = f"{file_name}:{line_no}"
+            auto = third_code is None
+            if auto:
+                free = unused.setdefault(keyword[:2], list(KEYORDER))
+                third_code = free.pop(0) if free else None
+            if char in chars:
+                results.append(diagnostic(file_name, line_no, 'error', 'duplicate',
+                                          f"{char!r} already coded at {chars[char]}"))
+                continue
+            chars[char] = where
+            if third_code is None:
+                results.append(diagnostic(file_name, line_no, 'error', 'no-code',
+                                          f"no third code left for '{keyword[:2]}', {char!r} is not coded"))
+                continue
+            if initial is None:
+                continue
+            code = initial + keyword[0] + third_code
+            if code in codes:
+                other, other_where = codes[code]
+                assigned = f" (auto-assigned <{third_code}>)" if auto else ''
+                results.append(diagnostic(file_name, line_no, 'error', 'conflict',
+                                          f"{char!r}{assigned} and {other!r} ({other_where}) both map to '{code}'"))
+            else:
+                codes[code] = (char, where)
+    return results
+
+def check_words(file_entries):
+    """依 cuf1.parse_word_file 的規則把所有 word*.txt 併入同一張表，標出被靜默改號或重複的詞組。"""
+    results = []
+    entries = {}  # key -> {num: (phrase, 位置)}
+    for file_name, word_entries in file_entries:
+        for line_no, key, num, phrase in word_entries:
+            where = f"{file_name}:{line_no}"
+            by_number = entries.setdefault(key, {})
+            if num != -1 and num in by_number and by_number[num][0] != phrase:
+                other, other_where = by_number[num]
+                new_num = 1
+                while new_num in by_number:
+                    new_num += 1
+                results.append(diagnostic(file_name, line_no, 'warning', 'renumbered',
+                                          f"{key}{num} was {other!r} ({other_where}); "
+                                          f"parsing silently moves it to {key}{new_num}"))
+                by_number[new_num] = by_number[num]
+                by_number[num] = (phrase, where)
+                continue
+            duplicate = next((n for n, (p, _) in by_number.items() if p == phrase), None)
+            if duplicate is not None:
+                if num == -1:
+                    results.append(diagnostic(file_name, line_no, 'info', 'duplicate',
+                                              f"{phrase!r} already listed as {key}{duplicate} ({by_number[duplicate][1]})"))
+                    continue
+                del by_number[duplicate]
+            elif num == -1:
+                num = 1
+                while num in by_number:
+                    num += 1
+            by_number[num] = (phrase, where)
+    return results
+
+def lint_tksm(file_name):
+    results = []
+    rows = {}
+    chars = {}
+    with open(file_name, encoding='utf-8') as file:
+        for line_no, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line or line.startswith("##"):
+                continue
+            match = re.match(r'^([a-z]{2})\s+(.{26})$', line)
+            if not match:
+                results.append(diagnostic(file_name, line_no, 'error', 'malformed',
+                                          "expected two-letter block and 26 characters"))
+                continue
+            block = match[1]
+            if block in rows:
+                results.append(diagnostic(file_name, line_no, 'error', 'duplicate',
+                                          f"block '{block}' already defined on line {rows[block]}"))
+                continue
+            rows[block] = line_no
+            for offset, char in enumerate(match[2]):
+                if char == EMPTY_SLOT:
+                    continue
+                code = block + KEYORDER[offset]
+                if char in chars:
+                    results.append(diagnostic(file_name, line_no, 'warning', 'duplicate',
+                                              f"{char!r} at '{code}' also at '{chars[char]}'"))
+                else:
+                    chars[char] = code
+    missing = len(KEYORDER) ** 2 - len(rows)
+    if missing:
+        results.append(diagnostic(file_name, 0, 'warning', 'missing-blocks', f"{missing} of 676 blocks missing"))
+    return results
+
+def checker_for(file_name):
+    base = os.path.basename(file_name)
+    if base.endswith('.cin'):
+        return lint_cin
+    if base.endswith('.lime'):
+        return lint_lime
+    if base == mem2tksm.OUTPUT_FILE:
+        return lint_tksm
+    if re.match(r'word.*\.txt$', base):
+        return lint_word
+    if re.match(r'mem.*\.txt$', base):
+        return lint_mem
+    return None
+
+CROSS_CHECKS = {lint_mem: check_mem, lint_word: check_words}
+
+def lint_file(file_name):
+    """回傳 (診斷, 解析出的項目)；只有 CROSS_CHECKS 中的檢查器會回傳項目，其餘為 None。"""
+    checker = checker_for(file_name)
+    if checker is None:
+        return [diagnostic(file_name, 0, 'error', 'unknown-format', "no linter for this file")], None
+    try:
+        outcome = checker(file_name)
+    except (OSError, UnicodeDecodeError) as e:
+        return [diagnostic(file_name, 0, 'error', 'unreadable', str(e))], None
+    return outcome if checker in CROSS_CHECKS else (outcome, None)
+
+def lint_files(files, jobs=None):
+    """各檔在工作行程中檢查，再對 mem*.txt 與 word*.txt 的解析結果做跨檔檢查。"""
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        outcomes = list(pool.map(lint_file, files))
+    results = [item for file_results, _ in outcomes for item in file_results]
+    for checker, cross_check in CROSS_CHECKS.items():
+        results += cross_check([(file_name, entries) for file_name, (_, entries) in zip(files, outcomes)
+                                if entries is not None and checker_for(file_name) is checker])
+    return results
+
+def default_files():
+    files = glob.glob('*.cin') + glob.glob('*.lime') + glob.glob('word*.txt') + glob.glob('mem*.txt')
+    if os.path.exists(mem2tksm.OUTPUT_FILE):
+        files.append(mem2tksm.OUTPUT_FILE)
+    return sorted(files)
+
+def main():
+    parser = argparse.ArgumentParser(description="Lint input-method dictionary files.")
+    parser.add_argument('files', nargs='*', help="files to check (default: all dictionaries in this directory)")
+    parser.add_argument('--json', action='store_true', help="print one JSON object per diagnostic")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--min-severity', choices=('info', 'warning', 'error'), default='warning')
+    args = parser.parse_args()
+
+    files = args.files or default_files()
+    levels = {'info': 0, 'warning': 1, 'error': 2}
+    threshold = levels[args.min_severity]
+    errors = 0
+    for item in lint_files(files, args.jobs):
+        errors += item['severity'] == 'error'
+        if levels[item['severity']] < threshold:
+            continue
+        if args.json:
+            print(json.dumps(item, ensure_ascii=False))
+        else:
+            print(f"{item['file']}:{item['line']}: {item['severity']}: [{item['code']}] {item['message']}")
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
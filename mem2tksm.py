@@ -1,12 +1,37 @@
+import argparse
+import os
 import re
 import glob
+from collections import Counter
+
+from keywords import KEYWORD_FILE, write_keyword_index
 
 # Define constants
 KEYORDER = "abcdefghijklmnopqrstuvwxyz"
 PINYIN_CIN = "pinyin.cin"
 OUTPUT_FILE = "tmp_tksm_words.txt"
+ANNOT_FILE = "tmp_tksm_mem_opt.txt"
 DEBUG = True  # Debug flag
 
+# Relative cost of pressing each key as the third code (QWERTY, touch typing).
+# Home row is cheapest, the bottom row and pinky/index stretches cost more.
+KEY_EFFORT = {
+    'f': 1.0, 'j': 1.0, 'd': 1.1, 'k': 1.1, 's': 1.3, 'l': 1.3, 'a': 1.6,
+    'g': 1.4, 'h': 1.4,
+    'r': 1.5, 'u': 1.5, 'e': 1.5, 'i': 1.5, 'w': 1.8, 'o': 1.8, 'q': 2.3, 'p': 2.3,
+    't': 1.9, 'y': 2.0,
+    'v': 2.0, 'm': 2.0, 'c': 2.0, 'n': 2.1, 'x': 2.3, 'b': 2.4, 'z': 2.6,
+}
+# Finger used for each key, for the same-finger penalty between second and third code.
+KEY_FINGER = {
+    'q': 0, 'a': 0, 'z': 0, 'w': 1, 's': 1, 'x': 1, 'e': 2, 'd': 2, 'c': 2,
+    'r': 3, 'f': 3, 'v': 3, 't': 3, 'g': 3, 'b': 3,
+    'y': 6, 'h': 6, 'n': 6, 'u': 6, 'j': 6, 'm': 6,
+    'i': 7, 'k': 7, 'o': 8, 'l': 8, 'p': 9,
+}
+SAME_FINGER_PENALTY = 1.0
+MNEMONIC_BONUS = 0.5  # Third codes taken from the keyword itself are easier to remember
+
 # Load data from pinyin.cin
 def load_cin(filename):
     pinyin_map = {}
@@ -61,6 +86,7 @@ def load_mem_txt(unused_table):
                             second_code = current_keyword[1]
 
                             # If no <...>, auto-assign from KEYORDER for (first_code, second_code)
+                            auto = not third_code
                             if not third_code:
                                 base_key = (parent_code, second_code)
                                 if base_key in unused_table and unused_table[base_key]:
@@ -71,7 +97,9 @@ def load_mem_txt(unused_table):
                             if char not in words_map:
                                 words_map[char] = {
                                     'parent_code': parent_code,
-                                    'third_code': third_code
+                                    'third_code': third_code,
+                                    'keyword': current_keyword,
+                                    'auto': auto
                                 }
                             else:
                                 print(f"Conflict detected for '{char}' at code '{third_code}'")
@@ -81,7 +109,9 @@ def load_mem_txt(unused_table):
                             if char not in words_map:
                                 words_map[char] = {
                                     'parent_code': current_keyword[0],
-                                    'third_code': current_keyword[1]
+                                    'third_code': current_keyword[1],
+                                    'keyword': current_keyword,
+                                    'auto': False
                                 }
                             else:
                                 print(f"Conflict detected for '{char}' at code '{current_keyword[:2]}'")
@@ -105,6 +135,7 @@ def generate_tksm_words(pinyin_map, words_map):
                 used_codes[base_code] = ["﹏"] * 26
             if used_codes[base_code][position_index] == "﹏":
                 used_codes[base_code][position_index] = char
+                data['code'] = base_code + third_code
             else:
                 print(f"Conflict: '{char}' conflicts at position {position_index} in code '{base_code}'")
         else:
@@ -114,6 +145,7 @@ def generate_tksm_words(pinyin_map, words_map):
             for i, slot in enumerate(used_codes[base_code]):
                 if slot == "﹏":
                     used_codes[base_code][i] = char
+                    data['code'] = base_code + KEYORDER[i]
                     break
 
     # Fill unused codes with placeholders
@@ -129,12 +161,153 @@ def generate_tksm_words(pinyin_map, words_map):
 
     return output_lines
 
+# Count character frequencies in a local text corpus
+def load_corpus_freq(filenames):
+    freq = Counter()
+    for filename in filenames:
+        with open(filename, encoding='utf-8') as file:
+            for line in file:
+                freq.update(line)
+    return freq
+
+# Cost of giving `char` the third code `slot` inside its block
+def slot_cost(data, slot, weight):
+    parent_code = data['parent_code']
+    effort = KEY_EFFORT[slot]
+    if KEY_FINGER[slot] == KEY_FINGER.get(parent_code) and slot != parent_code:
+        effort += SAME_FINGER_PENALTY
+    if slot in data.get('keyword', ''):
+        effort -= MNEMONIC_BONUS
+    return weight * effort
+
+# Re-assign auto third codes so frequent characters get cheap keys
+def optimize_third_codes(pinyin_map, words_map, freq):
+    """Place every auto-assigned character on a free slot of its three-key block.
+
+    Characters with an explicit <x> or a two-letter keyword code are fixed.
+    Inside each block (first pinyin initial + parent code) the free slots are
+    filled greedily by descending frequency, then improved with pairwise
+    swaps and moves until no exchange lowers the expected effort.
+    Returns the list of characters that could not be placed.
+    """
+    blocks = {}
+    for char, data in words_map.items():
+        code1 = pinyin_map[char][0] if char in pinyin_map else "?"
+        blocks.setdefault(code1 + data['parent_code'], []).append(char)
+
+    unplaced = []
+    for base_code, chars in blocks.items():
+        fixed = {}
+        movable = []
+        for char in chars:
+            data = words_map[char]
+            if data.get('auto'):
+                movable.append(char)
+            elif data['third_code'] in fixed:
+                print(f"Conflict: '{char}' and '{fixed[data['third_code']]}' both fixed at '{base_code}{data['third_code']}'")
+            else:
+                fixed[data['third_code']] = char
+        if not movable:
+            continue
+
+        weight = {char: freq.get(char, 0) + 1 for char in movable}  # +1 keeps unseen characters ordered
+        free = [slot for slot in KEYORDER if slot not in fixed]
+        movable.sort(key=lambda c: -weight[c])
+        if len(movable) > len(free):
+            for char in movable[len(free):]:
+                print(f"Conflict: no free third_code for '{char}' in block '{base_code}'")
+                words_map[char]['third_code'] = None
+                unplaced.append(char)
+            movable = movable[:len(free)]
+
+        # Greedy: most frequent characters take the cheapest remaining slot
+        placed = {}
+        for char in movable:
+            data = words_map[char]
+            slot = min((s for s in free if s not in placed),
+                       key=lambda s: slot_cost(data, s, weight[char]))
+            placed[slot] = char
+
+        # Local search: swap two characters, or move one to an empty slot
+        improved = True
+        while improved:
+            improved = False
+            for s1 in free:
+                for s2 in free:
+                    if s1 >= s2:
+                        continue
+                    c1, c2 = placed.get(s1), placed.get(s2)
+                    if c1 is None and c2 is None:
+                        continue
+                    before = after = 0.0
+                    if c1:
+                        before += slot_cost(words_map[c1], s1, weight[c1])
+                        after += slot_cost(words_map[c1], s2, weight[c1])
+                    if c2:
+                        before += slot_cost(words_map[c2], s2, weight[c2])
+                        after += slot_cost(words_map[c2], s1, weight[c2])
+                    if after + 1e-9 < before:
+                        placed.pop(s1, None)
+                        placed.pop(s2, None)
+                        if c1:
+                            placed[s2] = c1
+                        if c2:
+                            placed[s1] = c2
+                        improved = True
+
+        for slot, char in placed.items():
+            words_map[char]['third_code'] = slot
+    return unplaced
+
+# Expected per-character effort of the third code, weighted by corpus frequency
+def expected_effort(words_map, freq):
+    total = sum(freq.get(char, 0) for char in words_map) or 1
+    cost = 0.0
+    for char, data in words_map.items():
+        if data.get('third_code'):
+            cost += slot_cost(data, data['third_code'], freq.get(char, 0))
+    return cost / total
+
+# Write words_map back in mem*.txt syntax with explicit <x> annotations
+def generate_annotated_mem(words_map):
+    by_keyword = {}
+    for char, data in words_map.items():
+        by_keyword.setdefault(data.get('keyword') or data['parent_code'], []).append((char, data))
+
+    output_lines = []
+    for keyword, entries in by_keyword.items():
+        output_lines.append(keyword)
+        annotated = ''.join(f"{char}<{data['third_code']}>" for char, data in entries if data['third_code'])
+        if annotated:
+            output_lines.append(f"  {annotated}")
+    return output_lines
+
 # Main function
 def main():
+    parser = argparse.ArgumentParser(description=f"Build {OUTPUT_FILE} and {KEYWORD_FILE} from mem*.txt.")
+    parser.add_argument('--optimize', nargs='+', metavar='CORPUS',
+                        help=f"place auto-assigned third codes by the character frequencies of CORPUS "
+                             f"and write {ANNOT_FILE}")
+    args = parser.parse_args()
+    missing = [path for path in args.optimize or () if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"corpus not found: {', '.join(missing)}")
+
     pinyin_map = load_cin(PINYIN_CIN)
     unused_table = initialize_unused_table()
     words_map = load_mem_txt(unused_table)
 
+    if args.optimize:
+        freq = load_corpus_freq(args.optimize)
+        print(f"Expected third-code effort before: {expected_effort(words_map, freq):.3f}")
+        unplaced = optimize_third_codes(pinyin_map, words_map, freq)
+        print(f"Expected third-code effort after:  {expected_effort(words_map, freq):.3f}")
+        if unplaced:
+            print(f"Unplaced characters: {''.join(unplaced)}")
+        with open(ANNOT_FILE, "w", encoding="utf-8") as file:
+            file.write("\n".join(generate_annotated_mem(words_map)))
+        print(f"Annotated mnemonic table written to {ANNOT_FILE}")
+
     if DEBUG:
         print("Debug: Loaded pinyin_map:")
         for k, v in pinyin_map.items():
@@ -151,5 +324,9 @@ def main():
 
     print(f"Output written to {OUTPUT_FILE}")
 
+    # Keep the mnemonic keywords so the input loop can search them
+    write_keyword_index(words_map)
+    print(f"Keyword index written to {KEYWORD_FILE}")
+
 if __name__ == "__main__":
     main()
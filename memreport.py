@@ -0,0 +1,77 @@
+import gc
+import sys
+import tracemalloc
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+
+# Memory accounting for the loaded dictionaries.
+#
+# MemoryProfiler wraps each loader call and records, with tracemalloc, how
+# much it retained, its peak allocation while parsing and the net number of
+# allocated blocks; deep_size() walks a finished table and adds up
+# sys.getsizeof over every object it reaches.  Objects shared between tables
+# (interned keys, a shared string pool) are counted in each table.
+
+TOP_SITES = 3  # 每個載入步驟列出的主要配置位置數
+SKIP_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+
+def deep_size(obj):
+    """回傳 (位元組數, 物件數)，包含 obj 經由 gc.get_referents 可達的所有物件（不含類別、模組與函式）。"""
+    seen = set()
+    stack = [obj]
+    size = count = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, SKIP_TYPES):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        count += 1
+        if isinstance(item, dict):
+            # dict 的 tp_traverse 會略過字串鍵，改為直接列出鍵與值
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        else:
+            stack.extend(gc.get_referents(item))
+    return size, count
+
+class MemoryProfiler:
+    """以 tracemalloc 量測每個載入步驟；measure() 直接回傳載入函式的結果。"""
+
+    def __init__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.loaders = []  # (name, retained, peak, blocks, top sites)
+
+    def measure(self, name, func, *args):
+        gc.collect()
+        before = tracemalloc.take_snapshot()
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = func(*args)
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        # The snapshots themselves are allocated in tracemalloc.py and memreport.py
+        sites = [site for site in after.compare_to(before, 'lineno')
+                 if site.traceback[0].filename not in (tracemalloc.__file__, __file__)]
+        blocks = sum(site.count_diff for site in sites)
+        top = [site for site in sites if site.size_diff > 0][:TOP_SITES]
+        self.loaders.append((name, current - start, peak - start, blocks, top))
+        return result
+
+def format_report(profiler, tables):
+    """tables 為 {名稱: 物件}；回傳每張表與每個載入步驟的記憶體報告文字。"""
+    lines = ["Tables (deep size):", f"  {'table':<20}{'KB':>12}{'objects':>12}"]
+    total = 0
+    for name, table in tables.items():
+        size, count = deep_size(table)
+        total += size
+        lines.append(f"  {name:<20}{size / 1024:>12,.0f}{count:>12,}")
+    lines.append(f"  {'total':<20}{total / 1024:>12,.0f}")
+
+    lines += ["", "Loaders (tracemalloc):", f"  {'loader':<28}{'retained KB':>12}{'peak KB':>12}{'blocks':>12}"]
+    for name, retained, peak, blocks, top in profiler.loaders:
+        lines.append(f"  {name:<28}{retained / 1024:>12,.0f}{peak / 1024:>12,.0f}{blocks:>12,}")
+        for site in top:
+            frame = site.traceback[0]
+            lines.append(f"      {site.size_diff / 1024:>10,.0f} KB  {frame.filename.rsplit('/', 1)[-1]}:{frame.lineno}")
+    return "\n".join(lines)
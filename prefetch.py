@@ -0,0 +1,69 @@
+import threading
+
+PREFETCH_FANOUT = 6  # 每次閒置時預先計算的下一鍵數量
+PREFETCH_BUDGET = 256 * 1024  # 每次閒置時預先計算的候選文字上限（位元組，估計值）
+USAGE_WEIGHT = 8  # 使用者實際打過的前綴，相對於表中鍵數的權重
+
+class Prefetcher(threading.Thread):
+    """在等待按鍵時，預先計算目前前綴與可能下一鍵的候選清單並放入快取。
+
+    request() 在每次按鍵處理完後呼叫；cancel() 在收到下一個按鍵時呼叫，
+    讓進行中的預先計算在下一個項目前停止；stop() 在輸入迴圈結束時呼叫，結束執行緒。
+    """
+
+    def __init__(self, cache, compute, rank_next, modes=(';', '`')):
+        super().__init__(daemon=True)
+        self.cache = cache
+        self.compute = compute
+        self.rank_next = rank_next
+        self.modes = modes
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.pending = None
+        self.stopped = threading.Event()
+        self.prefetched = 0
+
+    def request(self, key_prefix, substring):
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, key_prefix, substring)
+            self.condition.notify()
+
+    def cancel(self):
+        with self.condition:
+            self.generation += 1
+            self.pending = None
+
+    def stop(self, timeout=1.0):
+        with self.condition:
+            self.stopped.set()
+            self.generation += 1
+            self.pending = None
+            self.condition.notify()
+        self.join(timeout)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped.is_set():
+                    self.condition.wait()
+                if self.stopped.is_set():
+                    return
+                generation, key_prefix, substring = self.pending
+                self.pending = None
+
+            budget = PREFETCH_BUDGET
+            prefixes = [substring] + [substring + key for key in self.rank_next(substring)[:PREFETCH_FANOUT]]
+            for prefix in prefixes:
+                for mode in self.modes:
+                    if self.generation != generation or budget <= 0:
+                        break
+                    if not prefix:
+                        continue  # 空前綴會列出整張表，不預先計算
+                    cache_key = key_prefix + (mode, prefix)
+                    if cache_key in self.cache:
+                        continue
+                    options, text = self.compute(mode, prefix)
+                    self.cache.put(cache_key, (options, text))
+                    self.prefetched += 1
+                    budget -= 4 * len(text) + 64 * len(options)
@@ -0,0 +1,41 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+class PrefixIndex:
+    """已排序的鍵位清單，以二分搜尋找出前綴相符的鍵。
+
+    matches() 依原表的插入順序回傳，與逐一掃描 dict 的結果（及候選編號）一致。
+    """
+
+    def __init__(self, keys):
+        ordered = list(keys)
+        order = sorted(range(len(ordered)), key=ordered.__getitem__)
+        self.keys = [ordered[i] for i in order]
+        self.ranks = array('I', order)
+        self.longest = max(map(len, self.keys), default=0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def span(self, prefix):
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\U0010ffff', lo)
+        return lo, hi
+
+    def matches(self, prefix):
+        lo, hi = self.span(prefix)
+        if hi - lo <= 1:
+            return self.keys[lo:hi]
+        ranked = sorted(range(lo, hi), key=self.ranks.__getitem__)
+        return [self.keys[i] for i in ranked]
+
+    def count(self, prefix):
+        lo, hi = self.span(prefix)
+        return hi - lo
+
+    def next_keys(self, prefix):
+        """統計以 prefix 開頭的鍵，下一個按鍵的分布。"""
+        lo, hi = self.span(prefix)
+        size = len(prefix)
+        return Counter(key[size] for key in self.keys[lo:hi] if len(key) > size)
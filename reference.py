@@ -0,0 +1,313 @@
+import re
+
+# Reference implementation of the cuf1 input loop.
+#
+# The parsers and the commit logic below are frozen copies of the original
+# cuf1.py: plain dicts, linear scans and enumerate() numbering, exactly as
+# first written.  They are kept slow on purpose.  difftest.py feeds the same
+# key streams to this engine and to cuf1.input_loop and reports every commit
+# on which the two disagree, so the optimized tables and indexes can change
+# freely as long as the output does not.
+#
+# Deliberate differences from the original code, matching later changes:
+#   - a segment without candidates commits nothing (the original reused the
+#     previous segment's options, or crashed when there were none);
+#   - '?' keyword segments are recognized and, without a keyword index,
+#     commit nothing; their letters are not decoded as three-key codes.
+
+def parse_mem_file(file_name):
+    """解析 tmp_tksm_words.txt 檔案為 mem2char 格式。
+
+    格式:
+    每行由索引（兩個小寫字母）和26個Unicode字符組成，例如：
+    aa ﹏﹏﹏黯﹏﹏暗﹏﹏﹏﹏﹏﹏﹏﹏﹏﹏﹏﹏﹏﹏﹏﹏﹏﹏
+    """
+    mem2char = {}
+    with open(file_name, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("##"):  # 跳過註解行和空行
+                continue
+
+            # 匹配索引和26個字符
+            match = re.match(r'^([a-z]{2})\s+(.{26})$', line)
+            if match:
+                index = match[1]  # 索引（例如 'aa', 'ab'）
+                data = list(match[2])  # 26個Unicode字符
+                mem2char[index] = data
+            else:
+                print(f"Invalid line format: {line}")
+    return mem2char
+
+def parse_word_file(file_name, word2pinyin, key2ph):
+    """解析單詞檔案，建立 key2ph 結構，用於查詢詞組與鍵位關聯。"""
+    def unescape_string(s):
+        """將轉義字符轉換為對應的實際字符"""
+        return s.replace(r'\"', '"').replace(r'\t', '\t').replace(r'\n', '\n')
+
+    with open(file_name, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()  # 去除行首尾的空白
+            if not line:  # 跳過空行
+                continue
+
+            # 判斷是否是以引號開頭的字符串
+            if line.startswith('"'):
+                # 找到結束的引號位置，處理轉義字符
+                match = re.match(r'"(.*?)"\s*(.*)', line)
+                if not match:
+                    print(f"Invalid format in line: {line}")
+                    continue
+
+                # 提取詞組和剩餘內容
+                raw_words, rest = match.groups()
+                words = [unescape_string(raw_words)]  # 將轉義字符解析為正常字符串
+            else:
+                # 傳統模式處理
+                parts = re.split(r'[\s\t]+', line, maxsplit=1)
+                words = [parts[0]]  # 第一部分是詞組，視為整體
+                rest = parts[1] if len(parts) > 1 else ''
+
+            num1 = -1  # 預設索引值
+            key1 = None
+
+            # 檢查剩餘內容是否包含 key/number
+            if rest.isdigit():
+                num1 = int(rest)
+            elif re.match(r'^[a-zA-Z]+\d*$', rest):
+                match = re.match(r'^([a-zA-Z]+)(\d*)$', rest)
+                if match:
+                    key1 = match[1]
+                    if match[2]:
+                        num1 = int(match[2])
+
+            # 如果 key1 為空，根據詞組生成 key1，默認為 'v'
+            if not key1:
+                key1_parts = [word2pinyin.get(char, '') for word in words for char in word]
+                key1 = ''.join(key1_parts) if any(key1_parts) else 'v'  # 如果沒有拼音，僅使用單一的 'v'
+
+            # 構建 key2ph
+            if key1:
+                if key1 not in key2ph:
+                    key2ph[key1] = []
+
+                # 查找是否已存在相同 key 和數字，但數據不同
+                conflicting_entry = next((entry for entry in key2ph[key1] if entry[0] == num1 and entry[1] != words), None)
+                if conflicting_entry:
+                    # 更新舊條目並分配新數字
+                    existing_numbers = {num for num, _ in key2ph[key1]}
+                    new_num = 1
+                    while new_num in existing_numbers:
+                        new_num += 1
+                    key2ph[key1].remove(conflicting_entry)
+                    key2ph[key1].append((new_num, conflicting_entry[1]))
+                    key2ph[key1].append((num1, words))
+                    key2ph[key1].sort(key=lambda x: x[0])  # 按數字排序
+                    continue
+
+                # 查找是否已存在相同的詞組與鍵位
+                existing_entry = next((entry for entry in key2ph[key1] if entry[1] == words), None)
+
+                # 如果 num1 是 -1 且已有相同項目，則不添加新項目
+                if num1 == -1:
+                    if existing_entry:
+                        continue
+                    # 選擇下一個未使用的數字
+                    existing_numbers = {num for num, _ in key2ph[key1]}
+                    num1 = 1  # 從 1 開始
+                    while num1 in existing_numbers:
+                        num1 += 1
+
+                # 如果存在相同的項目且 num1 不為 -1，替換數字
+                elif existing_entry:
+                    key2ph[key1].remove(existing_entry)
+                    key2ph[key1].append((num1, words))
+                    key2ph[key1].sort(key=lambda x: x[0])  # 按數字排序
+                    continue
+
+                # 添加新項目
+                key2ph[key1].append((num1, words))
+                key2ph[key1].sort(key=lambda x: x[0])  # 按數字排序
+
+def parse_lime_file(lime_file):
+    """解析 .lime 檔案，建立 word2pinyin 結構。"""
+    word2pinyin = {}
+    keys2word = {}
+    with open(lime_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split(',')
+            if len(parts) >= 2:
+                key, word = parts[0], parts[1]
+                if key not in keys2word:
+                    keys2word[key] = [word]
+                else:
+                    keys2word[key].append(word)
+            match = re.match(r'^([a-zA-Z]*\d*),([\u4e00-\u9fff]+):?.*$', line)
+            if match:
+                english = match[1]  # 英文字母鍵
+                character = match[2][0]  # 對應的漢字
+                if character not in word2pinyin:
+                    word2pinyin[character] = english[0] if english else ''
+    return word2pinyin, keys2word
+
+
+PAGE_LINES = 25  # cuf1.paginate 每頁行數
+
+def segment_options(mode, substring, key2ph, keys2word):
+    """原始程式在空白鍵上屏時為 / ` ; 段落建立的候選清單，每項最後一個元素為詞組。"""
+    options = []
+    if mode == '/':
+        matched_keys = [key for key in keys2word if key == substring]
+        for key in matched_keys:
+            for phrase in keys2word[key]:
+                options.append((key, phrase))
+    elif mode == '`':
+        matched_keys = [key for key in keys2word if key.startswith(substring)]
+        for key in matched_keys:
+            for phrase in keys2word[key]:
+                options.append((key, phrase))
+    elif mode == ';':
+        matched_keys = [key for key in key2ph if key.startswith(substring)]
+        for key in matched_keys:
+            for number, phrase in key2ph[key]:
+                options.append((key, number, phrase))
+    return options
+
+def commit(buffer, key2ph, mem2char, keys2word):
+    """空白鍵上屏：回傳 buffer 的上屏文字。"""
+    output_buffer = ''
+    pairs = re.findall(r'([a-zA-Z;/`?]+)(\d+)?', buffer)
+
+    for pair in pairs:
+        english, num_str = pair
+        num = int(num_str) if num_str else 1  # Default to 1 if no number is provided
+
+        mode = None
+        if '/' in english or '`' in english or ';' in english or '?' in english:
+            mode = '/' if '/' in english else '`' if '`' in english else ';' if ';' in english else '?'
+            substring = english.replace(mode, '')
+            if mode != '`' or len(substring) > 0:
+                options = segment_options(mode, substring, key2ph, keys2word)
+                for idx, option in enumerate(options, start=1):
+                    if num == idx:
+                        output_buffer += ''.join(option[-1])
+        else:
+            if english in key2ph:
+                matched_phrase = next(
+                    (phrase_list for number, phrase_list in key2ph[english] if number == num),
+                    None
+                )
+                if matched_phrase:
+                    output_buffer += ''.join(matched_phrase)
+            else:
+                # 當 key2ph 中無法找到英文單字時，啟用 3 字元分割邏輯
+                current_pos = 0
+                buffer2 = english
+                while len(buffer2[current_pos:]) >= 3:
+                    left_chars = buffer2[current_pos:current_pos + 3]
+                    mem_index = left_chars[:2]
+                    offset_char = left_chars[2]
+                    if 'a' <= offset_char <= 'z':
+                        offset = ord(offset_char) - ord('a')
+                        if mem_index in mem2char and offset < len(mem2char[mem_index]):
+                            output_buffer += mem2char[mem_index][offset]
+                        else:
+                            output_buffer += '?'
+                    else:
+                        output_buffer += '?'
+
+                    current_pos += 3
+                    english2 = buffer2[current_pos:]
+                    if english2 in key2ph:
+                        matched_phrase = next(
+                            (phrase_list for number, phrase_list in key2ph[english2] if number == num),
+                            None
+                        )
+                        if matched_phrase:
+                            output_buffer += ''.join(matched_phrase)
+                        break
+
+        # 當沒有提供數字時，處理 raw_chars（'?' 關鍵字段落除外）
+        if not num_str and mode != '?':
+            raw_chars = english
+            groups = [raw_chars[i:i+3] for i in range(0, len(raw_chars), 3)]
+            left_chars = ''
+            for group in groups:
+                if len(group) == 3:
+                    key = group[:2]
+                    index = ord(group[2]) - ord('a')
+                    if key in mem2char and 0 <= index < len(mem2char[key]):
+                        output_buffer += mem2char[key][index]
+                else:
+                    left_chars += group
+
+            if left_chars in key2ph:
+                for _, words in key2ph[left_chars]:
+                    output_buffer += ''.join(words)
+    return output_buffer
+
+class ReferenceEngine:
+    """以原始邏輯模擬輸入循環的緩衝區與游標，run() 回傳每次上屏的文字。"""
+
+    def __init__(self, key2ph, mem2char, keys2word):
+        self.key2ph = key2ph
+        self.mem2char = mem2char
+        self.keys2word = keys2word
+
+    def page_lines(self, substring):
+        """按 ~ 時 paginate 顯示的行數。"""
+        matched = sum(1 for key in self.key2ph if key.startswith(substring))
+        return matched or len(self.key2ph)
+
+    def run(self, keys):
+        outputs = []
+        buffer = ''
+        pos = 0
+        keys = iter(keys)
+        for char in keys:
+            if ord(char) in (3, 4):  # Ctrl-C (3) or Ctrl-D (4)
+                break
+            if char == '~':
+                # paginate 在每頁（最後一頁除外）之後讀鍵，直到空白鍵或 q
+                lines = self.page_lines(buffer[pos:])
+                for start in range(0, lines, PAGE_LINES):
+                    if start + PAGE_LINES >= lines:
+                        break
+                    key = next((key for key in keys if key in ' q'), None)
+                    if key is None:
+                        return outputs
+                    if key == 'q':
+                        break
+                continue
+            if char in '`?' and not buffer[pos:]:
+                continue
+            if char == ' ':
+                outputs.append(commit(buffer, self.key2ph, self.mem2char, self.keys2word))
+                buffer = ''
+                pos = 0
+                continue
+            if char == '\t':
+                continue
+            if char.isdigit():
+                buffer += char
+                pos = len(buffer)
+                continue
+            if ord(char) in (8, 127):  # Backspace key
+                if buffer:
+                    buffer = buffer[:-1]
+                    pos = min(pos, len(buffer))
+                continue
+            buffer += char
+        return outputs
+
+def load_tables(lime_file, word_files, mem_file=None):
+    """以原始解析函式載入所有表，回傳 (key2ph, mem2char, keys2word)。"""
+    mem2char = parse_mem_file(mem_file) if mem_file else {}
+    word2pinyin, keys2word = parse_lime_file(lime_file)
+    key2ph = {}
+    for file_name in word_files:
+        parse_word_file(file_name, word2pinyin, key2ph)
+    return key2ph, mem2char, keys2word
@@ -0,0 +1,123 @@
+from codespace import EMPTY_SLOT
+
+# Optimal segmentation of a plain (marker-free) composition segment.
+#
+# Every split of the typed letters into pieces is considered, where a piece
+# is a three-key code with a character in mem2char, a phrase key of key2ph,
+# a lime key of keys2word, or, when nothing else fits, up to three letters
+# committed as '?'.  best[i] holds the best parse of english[i:]; it is
+# filled right to left, and each position only tries pieces up to the
+# longest key, so a buffer of n letters costs O(n * longest key).
+#
+# Parses are compared by a score vector, added up piece by piece and
+# compared lexicographically:
+#   letters covered by resolved pieces (more is better),
+#   cost (lower is better): one per piece, plus one per letter a lime key
+#     is shorter than a full code, so "o" costs as much as three codes,
+#   letters covered by codes, phrase keys, then lime keys (more is better).
+# The first piece tried wins a tie, so the result is deterministic.
+#
+# A number typed after the segment selects a candidate of the longest
+# phrase or lime key the segment ends with.  If that key has no such
+# candidate the key is not committed, as in the greedy commit; the number
+# is not passed on to a shorter key (zg2 never becomes z + g #2).
+
+PHRASE, LIME, CODE, UNKNOWN = 'phrase', 'lime', 'code', '?'
+CODE_LEN = 3
+
+def add(a, b):
+    return tuple(x + y for x, y in zip(a, b))
+
+def piece_score(length, kind):
+    if kind == UNKNOWN:
+        return (0, -1, 0, 0, 0)
+    cost = 1 + (max(0, CODE_LEN - length) if kind == LIME else 0)
+    return (length, -cost, length if kind == CODE else 0, length if kind == PHRASE else 0,
+            length if kind == LIME else 0)
+
+class Segmenter:
+    """以動態規劃找出 english 的最佳切分。
+
+    num 為段落後打的編號，用於段落結尾最長的詞組或 lime 鍵；None 表示取第一個候選。
+    """
+
+    def __init__(self, key2ph, mem2char, keys2word, max_key_len):
+        self.key2ph = key2ph
+        self.mem2char = mem2char
+        self.keys2word = keys2word
+        self.max_key_len = max(max_key_len, CODE_LEN)
+
+    def pieces(self, english, i, last_num=None, last_start=None):
+        """從位置 i 開始的所有可用片段：(長度, 種類, 輸出文字)。
+
+        有編號時，結尾的詞組或 lime 片段只能是從 last_start 開始的那一個鍵。
+        """
+        n = len(english)
+        for end in range(min(n, i + self.max_key_len), i, -1):
+            key = english[i:end]
+            num = last_num if end == n else None
+            keyed = num is None or i == last_start
+            if keyed and key in self.key2ph:
+                entries = self.key2ph[key]
+                if num is None:
+                    phrase = ''.join(entries[0][1]) if entries else None
+                else:
+                    phrase = next((''.join(words) for number, words in entries if number == num), None)
+                if phrase:
+                    yield end - i, PHRASE, phrase
+            if keyed and key in self.keys2word:
+                words = self.keys2word[key]
+                index = 0 if num is None else num - 1
+                if 0 <= index < len(words):
+                    yield end - i, LIME, words[index]
+            if end - i == CODE_LEN:
+                char = self.code_char(key)
+                if char is not None:
+                    yield CODE_LEN, CODE, char
+        yield min(CODE_LEN, n - i), UNKNOWN, '?'
+
+    def numbered_key_start(self, english):
+        """english 結尾最長的詞組或 lime 鍵的起點；沒有時回傳 None。"""
+        for start in range(max(0, len(english) - self.max_key_len), len(english)):
+            key = english[start:]
+            if key in self.key2ph or key in self.keys2word:
+                return start
+        return None
+
+    def has_number(self, key, num):
+        if key in self.key2ph and any(number == num for number, _ in self.key2ph[key]):
+            return True
+        return key in self.keys2word and 1 <= num <= len(self.keys2word[key])
+
+    def code_char(self, code):
+        offset = ord(code[2]) - ord('a')
+        row = self.mem2char.get(code[:2])
+        if row is None or not 0 <= offset < len(row) or row[offset] == EMPTY_SLOT:
+            return None
+        return row[offset]
+
+    def parse(self, english, num=None):
+        """回傳最佳切分 [(片段, 種類, 輸出文字), ...]；編號不存在的結尾鍵以輸出文字 '' 的 '?' 片段表示。"""
+        start = None
+        if num is not None:
+            start = self.numbered_key_start(english)
+            if start is not None and not self.has_number(english[start:], num):
+                return self.parse(english[:start]) + [(english[start:], UNKNOWN, '')]
+        n = len(english)
+        best = [None] * (n + 1)  # best[i] = (分數, 片段長度, 種類, 輸出文字)
+        best[n] = ((0, 0, 0, 0, 0), 0, None, '')
+        for i in range(n - 1, -1, -1):
+            for length, kind, text in self.pieces(english, i, num, start):
+                score = add(best[i + length][0], piece_score(length, kind))
+                if best[i] is None or score > best[i][0]:
+                    best[i] = (score, length, kind, text)
+        parse = []
+        i = 0
+        while i < n:
+            _, length, kind, text = best[i]
+            parse.append((english[i:i + length], kind, text))
+            i += length
+        return parse
+
+    def text(self, english, num=None):
+        return ''.join(text for _, _, text in self.parse(english, num))
@@ -0,0 +1,159 @@
+import argparse
+import contextlib
+import os
+import time
+
+import cuf1
+
+# Keystroke session recorder and replayer for cuf1.input_loop.
+#
+# File format: the header b"TKSR1\n", then one record per key:
+# the delay since the previous key in milliseconds as a LEB128 varint,
+# followed by the key itself in UTF-8.
+
+HEADER = b"TKSR1\n"
+END_KEY = '\x04'  # Ctrl-D, ends input_loop
+FRAME_BUDGET_MS = 1000 / 60
+
+def write_varint(file, value):
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            file.write(bytes((byte | 0x80,)))
+        else:
+            file.write(bytes((byte,)))
+            return
+
+def read_session(path):
+    """讀取錄製檔，回傳 [(延遲毫秒, 按鍵), ...]。"""
+    with open(path, 'rb') as file:
+        data = file.read()
+    if not data.startswith(HEADER):
+        raise ValueError(f"{path}: not a keystroke session file")
+    records = []
+    pos = len(HEADER)
+    while pos < len(data):
+        delay = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            delay |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        # UTF-8 lead byte gives the length of the key
+        lead = data[pos]
+        size = 1 if lead < 0x80 else 2 if lead < 0xe0 else 3 if lead < 0xf0 else 4
+        records.append((delay, data[pos:pos + size].decode('utf-8')))
+        pos += size
+    return records
+
+class KeyRecorder:
+    """包裝 read_key，將每個按鍵與間隔時間寫入錄製檔。"""
+
+    def __init__(self, read_key, path):
+        self.read_key = read_key
+        self.file = open(path, 'wb')
+        self.file.write(HEADER)
+        self.last = time.perf_counter()
+
+    def __call__(self):
+        key = self.read_key()
+        now = time.perf_counter()
+        write_varint(self.file, round((now - self.last) * 1000))
+        self.file.write(key.encode('utf-8'))
+        self.last = now
+        return key
+
+    def close(self):
+        self.file.close()
+
+class KeyReplayer:
+    """依錄製時間（或 speed 倍速、speed=0 時不等待）送出按鍵，並量測每鍵處理延遲。"""
+
+    def __init__(self, records, speed=1.0, budget_ms=FRAME_BUDGET_MS):
+        self.records = records
+        self.speed = speed
+        self.budget = budget_ms / 1000
+        self.index = 0
+        self.start = None
+        self.offset = 0.0
+        self.returned_at = None
+        self.latencies = []
+        self.late = 0
+
+    def __call__(self):
+        now = time.perf_counter()
+        if self.returned_at is not None:
+            self.latencies.append(now - self.returned_at)
+        if self.index >= len(self.records):
+            return END_KEY
+        delay, key = self.records[self.index]
+        self.index += 1
+
+        if self.start is None:
+            self.start = now
+        if self.speed > 0:
+            self.offset += delay / 1000 / self.speed
+            scheduled = self.start + self.offset
+            if scheduled > now:
+                time.sleep(scheduled - now)
+            elif now - scheduled > self.budget:
+                self.late += 1  # Previous keys overran and this key is delivered late
+        self.returned_at = time.perf_counter()
+        return key
+
+    def report(self):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return "No keys replayed."
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        elapsed = time.perf_counter() - self.start
+        dropped = sum(1 for latency in latencies if latency > self.budget)
+        return "\n".join([
+            f"Keys: {len(latencies)} in {elapsed:.3f} s ({len(latencies) / elapsed:.0f} keys/s)",
+            f"Latency ms: mean {sum(latencies) / len(latencies) * 1000:.3f}, p50 {percentile(0.5):.3f}, "
+            f"p95 {percentile(0.95):.3f}, p99 {percentile(0.99):.3f}, max {latencies[-1] * 1000:.3f}",
+            f"Dropped frames (> {self.budget * 1000:.1f} ms): {dropped}, late deliveries: {self.late}",
+        ])
+
+def record(path):
+    recorder = KeyRecorder(cuf1.getch, path)
+    try:
+        cuf1.main(read_key=recorder)
+    finally:
+        recorder.close()
+    print(f"Session written to {path}")
+
+def replay(path, speed, budget_ms):
+    replayer = KeyReplayer(read_session(path), speed, budget_ms)
+    mem2char, loader = cuf1.start_tables()
+    loader.wait()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        cuf1.input_loop({}, mem2char, {}, loader=loader, read_key=replayer)
+    print(replayer.report())
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay cuf1 typing sessions.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help="type normally and save the keystrokes")
+    record_parser.add_argument('file')
+    replay_parser = commands.add_parser('replay', help="feed a saved session into the input loop")
+    replay_parser.add_argument('file')
+    replay_parser.add_argument('--speed', type=float, default=1.0, help="replay speed factor, e.g. 4 for 4x")
+    replay_parser.add_argument('--fast', action='store_true', help="replay flat-out without delays")
+    replay_parser.add_argument('--budget-ms', type=float, default=FRAME_BUDGET_MS,
+                               help="per-key budget for the dropped-frame count")
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.file)
+    else:
+        replay(args.file, 0 if args.fast else args.speed, args.budget_ms)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import socket
+import stat
+import threading
+import time
+
+from atomicfile import replace_file
+
+# Output sinks for committed text.
+#
+# The input loops hand every commit to an OutputWriter, which only appends
+# it to an in-memory queue; a background thread takes whatever has queued
+# up, joins it into one batch and writes it to the sink.  A slow or absent
+# consumer (a FIFO nobody reads, a busy socket peer) therefore delays the
+# writer thread only.  The queue is bounded: once MAX_PENDING characters are
+# waiting, further commits are dropped and counted instead of blocking the
+# keystroke that produced them.
+
+MAX_PENDING = 1 << 20  # 佇列中最多等待寫出的字元數
+BATCH_DELAY = 0.005  # 取到第一筆後再等待的秒數，讓連續上屏合併成一次寫入
+
+class Sink:
+    """輸出端介面：write_batch() 由寫出執行緒呼叫；寫入失敗時呼叫 close()，下一批重新開啟。"""
+
+    def write_batch(self, texts):
+        self.write(''.join(texts))
+
+    def close(self):
+        pass
+
+class FileSink(Sink):
+    """附加寫入一般檔案。"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def write(self, text):
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(text)
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError:  # 讀取端已關閉的管道，緩衝中的文字無法再寫出
+                pass
+            self.file = None
+
+class FifoSink(FileSink):
+    """寫入具名管道，不存在時建立；開啟會等到有讀取端，讀取端關閉後重新等待。"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        if not os.path.exists(path):
+            os.mkfifo(path)
+        elif not stat.S_ISFIFO(os.stat(path).st_mode):
+            raise ValueError(f"{path}: not a FIFO")
+
+class SocketSink(Sink):
+    """以 Unix domain socket 連線到編輯器等接收端，斷線後下一批重新連線。"""
+
+    def __init__(self, path):
+        self.path = path
+        self.sock = None
+
+    def write(self, text):
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                self.sock.connect(self.path)
+            except OSError:
+                self.close()
+                raise
+        self.sock.sendall(text.encode('utf-8'))
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+class ClipboardSink(Sink):
+    """剪貼簿替身：只保留最近一次上屏的文字；指定 path 時整檔替換為該文字。"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.text = ''
+
+    def write_batch(self, texts):
+        self.write(texts[-1])  # 同一批中較早的文字會立刻被覆蓋，不必寫出
+
+    def write(self, text):
+        self.text = text
+        if self.path:
+            with replace_file(self.path, 'w', encoding='utf-8') as file:
+                file.write(text)
+
+SINKS = {'file': FileSink, 'fifo': FifoSink, 'socket': SocketSink, 'clipboard': ClipboardSink}
+
+def open_sink(spec):
+    """由 "kind:path" 建立輸出端，例如 file:out.txt、fifo:/tmp/ime、socket:/tmp/ime.sock、clipboard。"""
+    kind, _, path = spec.partition(':')
+    if kind not in SINKS:
+        raise ValueError(f"unknown output {kind!r}; expected one of {', '.join(SINKS)}")
+    if kind == 'clipboard':
+        return ClipboardSink(path or None)
+    if not path:
+        raise ValueError(f"{spec!r}: missing path")
+    return SINKS[kind](path)
+
+class OutputWriter(threading.Thread):
+    """背景寫出執行緒：submit() 只把文字放入佇列，由本執行緒把累積的文字整批交給輸出端。"""
+
+    def __init__(self, sink, max_pending=MAX_PENDING, batch_delay=BATCH_DELAY):
+        super().__init__(daemon=True)
+        self.sink = sink
+        self.max_pending = max_pending
+        self.batch_delay = batch_delay
+        self.condition = threading.Condition()
+        self.queue = []
+        self.pending = 0  # 佇列中的字元數
+        self.in_flight = 0  # 寫出執行緒正在寫的字元數
+        self.closing = False
+        self.written = self.batches = self.dropped = 0
+        self.error = None
+
+    def submit(self, text):
+        """放入一筆上屏文字；佇列已滿時丟棄並回傳 False，不會阻塞。"""
+        if not text:
+            return True
+        with self.condition:
+            if self.closing or self.pending + len(text) > self.max_pending:
+                self.dropped += len(text)
+                return False
+            self.queue.append(text)
+            self.pending += len(text)
+            self.condition.notify_all()
+        return True
+
+    def flush(self, timeout=None):
+        """等待佇列寫完；逾時回傳 False。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.queue or self.in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def close(self, timeout=1.0):
+        """寫完佇列後結束執行緒；接收端遲遲不讀時最多等待 timeout 秒，剩餘的文字計入 dropped。"""
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        self.join(timeout)
+        if self.is_alive():
+            with self.condition:
+                self.dropped += self.pending + self.in_flight
+                self.queue, self.pending = [], 0
+        else:
+            self.sink.close()
+
+    def stats(self):
+        text = f"written {self.written} chars in {self.batches} batches, dropped {self.dropped}"
+        return text + (f", last error: {self.error}" if self.error else '')
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue and not self.closing:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+            if self.batch_delay and not self.closing:
+                time.sleep(self.batch_delay)
+            with self.condition:
+                batch, self.queue, self.pending = self.queue, [], 0
+                self.in_flight = sum(map(len, batch))
+            try:
+                self.sink.write_batch(batch)
+                self.written += self.in_flight
+                self.batches += 1
+            except OSError as e:
+                self.error = e
+                self.dropped += self.in_flight
+                self.sink.close()
+            finally:
+                with self.condition:
+                    self.in_flight = 0
+                    self.condition.notify_all()
@@ -0,0 +1,67 @@
+import threading
+from types import MappingProxyType
+
+# Immutable table snapshots.
+#
+# A loader builds every table and index for one generation of the
+# dictionaries, wraps them in a TableSnapshot and publishes it to a
+# TableStore by replacing a single reference.  Readers take
+# `store.snapshot` once and use it for as long as they like: nothing in a
+# snapshot is changed after publication, so any number of reader threads
+# can look up without a lock while a rebuild prepares the next snapshot.
+
+def freeze_rows(mem2char):
+    """mem2char 的唯讀版本：每列轉為 tuple，外層包成 MappingProxyType。"""
+    if isinstance(mem2char, MappingProxyType):
+        return mem2char
+    return MappingProxyType({block: tuple(row) for block, row in mem2char.items()})
+
+class TableSnapshot:
+    """一代完整的查詢表與索引；建立後不可修改。"""
+
+    __slots__ = ('generation', 'mem2char', 'key2ph', 'keys2word', 'word2pinyin', 'ph_index', 'lime_index',
+                 'ph_prefix', 'lime_prefix', 'associations', 'unique')
+
+    def __init__(self, generation, mem2char, key2ph, keys2word, **indexes):
+        values = dict.fromkeys(self.__slots__)
+        values.update(indexes, generation=generation, mem2char=freeze_rows(mem2char),
+                      key2ph=key2ph, keys2word=keys2word)
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def tables(self):
+        """{名稱: 物件}，供 --memory-report 逐表統計。"""
+        return {name: getattr(self, name) for name in self.__slots__[1:]}
+
+class TableStore:
+    """目前發布中的 TableSnapshot；publish() 以單一參照替換，讀取端不需加鎖。
+
+    sources 記錄最近一次載入所用的檔案，供重新載入使用。
+    """
+
+    def __init__(self, snapshot, ready=False):
+        self.snapshot = snapshot
+        self.sources = None
+        self.issued = snapshot.generation
+        self.ready = threading.Event()
+        self.lock = threading.Lock()  # 只讓載入端互斥，避免較舊的重建覆蓋較新的快照
+        if ready:
+            self.ready.set()
+
+    def next_generation(self):
+        """開始重建時取得新的代數；較晚開始的重建在發布時優先。"""
+        with self.lock:
+            self.issued += 1
+            return self.issued
+
+    def publish(self, snapshot):
+        with self.lock:
+            if snapshot.generation > self.snapshot.generation:
+                self.snapshot = snapshot
+        self.ready.set()
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
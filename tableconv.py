@@ -0,0 +1,304 @@
+import argparse
+import heapq
+import itertools
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+
+from atomicfile import replace_file
+from codespace import CODE_SPACE, EMPTY_SLOT, KEYORDER, code_index
+from trie import read_trie, write_trie
+
+# Streaming readers and writers for the table formats used by the scripts.
+#
+# Every format is seen as a stream of (key, value) pairs:
+#   cin   - pinyin.cin style, "key value" rows inside %chardef begin/end
+#   lime  - "key,value" rows
+#   words - word*.txt rows, "phrase key" (value first)
+#   tksm  - tmp_tksm_words.txt, one row per two-key block with 26 slots
+#   tkb   - compiled binary: sorted records with an offsets index
+#   tkt   - compiled packed trie (trie.py), keys in first-seen order
+# Readers are generators and writers consume iterators, so conversions run
+# in constant memory; only the sorted tkb export buffers a bounded run.
+
+TKB_MAGIC = b"TKB1"
+RUN_SIZE = 50000  # Records per sorted run when compiling to tkb
+
+def read_cin(path):
+    with open(path, encoding='utf-8') as file:
+        in_chardef = False
+        for line in file:
+            line = line.strip()
+            if line == "%chardef begin":
+                in_chardef = True
+            elif line == "%chardef end":
+                in_chardef = False
+            elif in_chardef and line:
+                parts = line.split()
+                if len(parts) >= 2:
+                    yield parts[0], parts[1]
+
+def write_cin(pairs, path, name="TriKeySndMem"):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(f"%gen_inp\n%ename {name}\n%cname {name}\n%selkey 1234567890\n%chardef begin\n")
+        for key, value in pairs:
+            file.write(f"{key} {value}\n")
+        file.write("%chardef end\n")
+
+def read_lime(path, skip_empty_keys=True):
+    """讀取 "key,value" 列；skip_empty_keys=False 時保留空鍵的列，與 cuf1.parse_lime_file 相同。"""
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            parts = line.strip().split(',')
+            if len(parts) >= 2 and (parts[0] or not skip_empty_keys):
+                yield parts[0], parts[1]
+
+def write_lime(pairs, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        for key, value in pairs:
+            file.write(f"{key},{value}\n")
+
+def read_words(path, word2pinyin=None):
+    """讀取 word*.txt；未寫鍵位的詞組以 word2pinyin 推得鍵位（與 cuf1.parse_word_file 相同，預設 'v'）。
+
+    只產生 (鍵, 詞組)：編號與 parse_word_file 的重新編號不保留，要編號的表請用 cuf1.parse_word_file。
+    """
+    word2pinyin = word2pinyin or {}
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('"'):
+                match = re.match(r'"(.*?)"\s*(.*)', line)
+                if not match:
+                    continue
+                phrase, rest = match.groups()
+            else:
+                parts = re.split(r'[\s\t]+', line, maxsplit=1)
+                phrase, rest = parts[0], parts[1] if len(parts) > 1 else ''
+            match = re.match(r'^([a-zA-Z]+)\d*$', rest)
+            if match:
+                key = match[1]
+            else:
+                key = ''.join(word2pinyin.get(char, '') for char in phrase) or 'v'
+            yield key, phrase
+
+def write_words(pairs, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        for key, value in pairs:
+            if re.search(r'\s|"', value):
+                value = '"' + value.replace('"', r'\"').replace('\t', r'\t').replace('\n', r'\n') + '"'
+            file.write(f"{value} {key}\n")
+
+def read_tksm(path):
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            match = re.match(r'^([a-z]{2})\s+(.{26})$', line.strip())
+            if match:
+                for offset, char in enumerate(match[2]):
+                    if char != EMPTY_SLOT:
+                        yield match[1] + KEYORDER[offset], char
+
+def write_tksm(pairs, path):
+    """寫出 676 列的三碼表；只接受三個小寫字母的鍵與單一字元，其餘略過。同碼以先到者為準。"""
+    slots = [EMPTY_SLOT] * CODE_SPACE
+    skipped = 0
+    for key, value in pairs:
+        index = code_index(key)
+        if index < 0 or len(value) != 1:
+            skipped += 1
+            continue
+        if slots[index] == EMPTY_SLOT:
+            slots[index] = value
+        else:
+            skipped += 1
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("## ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ\n")
+        for block in range(676):
+            file.write(f"{KEYORDER[block // 26]}{KEYORDER[block % 26]} {''.join(slots[block * 26:block * 26 + 26])}\n")
+    if skipped:
+        print(f"{path}: skipped {skipped} entries that are not free three-key codes", file=sys.stderr)
+
+def sorted_runs(pairs, tmpdir):
+    """將輸入切成每段 RUN_SIZE 筆的已排序暫存檔，保留同鍵的原始順序。"""
+    runs = []
+    counter = itertools.count()
+    while True:
+        chunk = [(key, next(counter), value) for key, value in itertools.islice(pairs, RUN_SIZE)]
+        if not chunk:
+            return runs
+        chunk.sort()
+        run_path = os.path.join(tmpdir, f"run{len(runs)}")
+        with open(run_path, 'w', encoding='utf-8') as file:
+            for key, seq, value in chunk:
+                file.write(f"{key}\t{seq}\t{value}\n")
+        runs.append(run_path)
+
+def read_run(path):
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            key, seq, value = line.rstrip('\n').split('\t', 2)
+            yield key, int(seq), value
+
+def sort_pairs(pairs, tmpdir, unique=False):
+    """外部合併排序，同鍵保留原始順序；unique 為真時去除重複的 (key, value)，保留第一次出現者。"""
+    current_key, seen = None, set()  # 同鍵的值依輸入順序排列而非相鄰，記下目前鍵已輸出的值
+    for key, _, value in heapq.merge(*(read_run(run) for run in sorted_runs(iter(pairs), tmpdir))):
+        if unique:
+            if key != current_key:
+                current_key, seen = key, set()
+            if value in seen:
+                continue
+            seen.add(value)
+        yield key, value
+
+def write_tkb(pairs, path):
+    """編譯為二進位表：magic、筆數、位移索引 (uint32 × (n+1))，接著 "key\\tvalue" UTF-8 紀錄（依鍵排序）。"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        data_path = os.path.join(tmpdir, "data")
+        offsets_path = os.path.join(tmpdir, "offsets")
+        count = 0
+        position = 0
+        with open(data_path, 'wb') as data, open(offsets_path, 'wb') as offsets:
+            offsets.write(struct.pack('<I', 0))
+            for key, value in sort_pairs(pairs, tmpdir):
+                record = f"{key}\t{value}".encode('utf-8')
+                data.write(record)
+                position += len(record)
+                offsets.write(struct.pack('<I', position))
+                count += 1
+        # 執行中的程式可能正以 mmap 開著舊檔，不能就地截斷重寫
+        with replace_file(path) as out:
+            out.write(TKB_MAGIC + struct.pack('<I', count))
+            for part in (offsets_path, data_path):
+                with open(part, 'rb') as file:
+                    shutil.copyfileobj(file, out)
+
+class TkbTable:
+    """以 mmap 開啟編譯後的 tkb 檔，就地查詢。"""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:4] != TKB_MAGIC:
+            raise ValueError(f"{path}: not a compiled table")
+        self.count = struct.unpack_from('<I', self.map, 4)[0]
+        self.offsets = memoryview(self.map)[8:8 + 4 * (self.count + 1)].cast('I')
+        self.data_start = 8 + 4 * (self.count + 1)
+
+    def __len__(self):
+        return self.count
+
+    def record(self, i):
+        start = self.data_start + self.offsets[i]
+        end = self.data_start + self.offsets[i + 1]
+        key, value = self.map[start:end].decode('utf-8').split('\t', 1)
+        return key, value
+
+    def key_at(self, i):
+        start = self.data_start + self.offsets[i]
+        end = self.data_start + self.offsets[i + 1]
+        return self.map[start:self.map.find(b'\t', start, end)].decode('utf-8')
+
+    def lower_bound(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, key):
+        """回傳 key 的所有值，依原始順序。"""
+        values = []
+        for i in range(self.lower_bound(key), self.count):
+            record_key, value = self.record(i)
+            if record_key != key:
+                break
+            values.append(value)
+        return values
+
+    def prefix(self, prefix):
+        for i in range(self.lower_bound(prefix), self.count):
+            key, value = self.record(i)
+            if not key.startswith(prefix):
+                break
+            yield key, value
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.record(i)
+
+    def close(self):
+        self.offsets.release()
+        self.map.close()
+        self.file.close()
+
+def read_tkb(path):
+    table = TkbTable(path)
+    try:
+        yield from table
+    finally:
+        table.close()
+
+READERS = {'cin': read_cin, 'lime': read_lime, 'words': read_words, 'tksm': read_tksm, 'tkb': read_tkb,
+           'tkt': read_trie}
+WRITERS = {'cin': write_cin, 'lime': write_lime, 'words': write_words, 'tksm': write_tksm, 'tkb': write_tkb,
+           'tkt': write_trie}
+
+def guess_format(path):
+    base = os.path.basename(path)
+    if base.startswith('tmp_tksm') or base.endswith('.tksm'):
+        return 'tksm'
+    for extension in ('cin', 'lime', 'tkb', 'tkt'):
+        if base.endswith('.' + extension):
+            return extension
+    if base.endswith('.txt'):
+        return 'words'
+    raise ValueError(f"cannot guess the format of {path}; use --from/--to")
+
+def convert(inputs, output, from_format=None, to_format=None, unique=False, word2pinyin=None):
+    """串接所有輸入並寫成指定格式；unique 時以外部排序去重（輸出依鍵排序）。"""
+    def pairs():
+        for path in inputs:
+            fmt = from_format or guess_format(path)
+            if fmt == 'words':
+                yield from read_words(path, word2pinyin)
+            else:
+                yield from READERS[fmt](path)
+
+    to_format = to_format or guess_format(output)
+    stream = pairs()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if unique:
+            stream = sort_pairs(stream, tmpdir, unique=True)
+        WRITERS[to_format](stream, output)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert and merge .cin, .lime, word-list, tksm and compiled tables.")
+    parser.add_argument('inputs', nargs='+')
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--from', dest='from_format', choices=sorted(READERS))
+    parser.add_argument('--to', dest='to_format', choices=sorted(WRITERS))
+    parser.add_argument('--unique', action='store_true', help="sort by key and drop duplicate (key, value) pairs")
+    parser.add_argument('--lime', help="lime file used to key word-list rows that have no key")
+    args = parser.parse_args()
+
+    word2pinyin = None
+    if args.lime:
+        word2pinyin = {}
+        for key, value in read_lime(args.lime):
+            if value and '一' <= value[0] <= '鿿' and value[0] not in word2pinyin:
+                word2pinyin[value[0]] = key[0]
+    convert(args.inputs, args.output, args.from_format, args.to_format, args.unique, word2pinyin)
+    print(f"Written {args.output}")
+
+if __name__ == "__main__":
+    main()
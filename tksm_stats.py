@@ -0,0 +1,164 @@
+import contextlib
+import io
+import os
+from array import array
+
+import mem2tksm
+from codespace import CODE_SPACE, EMPTY_SLOT, KEYORDER, block_index, code_index
+from cuf1 import parse_lime_file, parse_mem_file
+from uniok import B5, COMMON, GB, JP, load_uniok_flags
+
+# Code-space and coverage statistics for all dictionaries.
+#
+# Every table is folded into flat arrays: one slot per three-key code
+# (26 * 26 * 26 = 17576) and one byte of flags per Unicode code point.
+# Counts are then taken with bytes.translate()/count() and slice sums
+# instead of looping over Python dicts.
+
+LIME_FILE = 'cuf_keyboard_m01.lime'
+MEM_FILE = mem2tksm.OUTPUT_FILE
+HEAT_CHARS = " .:-=+*#%@"
+
+# Table flags, stored above the uniok charset bits (B5/GB/JP/COMMON)
+CIN = COMMON << 1
+MEM = COMMON << 2
+LIME = COMMON << 3
+
+def is_code(code):
+    return bool(code) and all(len(key) == 1 and key in KEYORDER for key in code)
+
+def mask_table(want, unwanted=0):
+    """建立 translate 用的對照表：含 want 全部位元且不含 unwanted 的旗標映成 1。"""
+    return bytes(1 if value & want == want and not value & unwanted else 0 for value in range(256))
+
+def count_mask(flags, want, unwanted=0):
+    return flags.translate(mask_table(want, unwanted)).count(1)
+
+def chars_with_mask(flags, want, unwanted=0, limit=40):
+    """回傳符合條件的前 limit 個字，用於列出範例。"""
+    hits = flags.translate(mask_table(want, unwanted))
+    chars = []
+    start = hits.find(1)
+    while start != -1 and len(chars) < limit:
+        chars.append(chr(start))
+        start = hits.find(1, start + 1)
+    return ''.join(chars)
+
+def render_heatmap(block_counts, scale=26):
+    """將 676 個兩碼區塊的計數畫成 26x26 熱度圖（列：第一碼，欄：第二碼）。"""
+    lines = ["   " + KEYORDER]
+    for row, key1 in enumerate(KEYORDER):
+        cells = block_counts[row * 26:(row + 1) * 26]
+        line = ''.join(HEAT_CHARS[min(len(HEAT_CHARS) - 1, (count * (len(HEAT_CHARS) - 1) + scale - 1) // scale)]
+                       for count in cells)
+        lines.append(f"{key1}  {line}")
+    return "\n".join(lines)
+
+def load_tables():
+    pinyin_map = mem2tksm.load_cin(mem2tksm.PINYIN_CIN)
+    mem2char = parse_mem_file(MEM_FILE) if os.path.exists(MEM_FILE) else {}
+    keys2word = parse_lime_file(LIME_FILE)[1] if os.path.exists(LIME_FILE) else {}
+    loader_messages = io.StringIO()
+    with contextlib.redirect_stdout(loader_messages):
+        words_map = mem2tksm.load_mem_txt(mem2tksm.initialize_unused_table())
+    return pinyin_map, mem2char, keys2word, words_map, loader_messages.getvalue().count("\n")
+
+def main():
+    pinyin_map, mem2char, keys2word, words_map, loader_conflicts = load_tables()
+    flags, counts = load_uniok_flags()
+
+    # 1. Generated table: slot occupancy per three-key code
+    slots = bytearray(CODE_SPACE)
+    for block, data in mem2char.items():
+        row = ''.join(data)
+        base = block_index(block) * 26
+        slots[base:base + 26] = bytes(0 if char == EMPTY_SLOT else 1 for char in row)
+        for char in row:
+            if char != EMPTY_SLOT:
+                flags[ord(char)] |= MEM
+    block_counts = array('H', (sum(slots[i:i + 26]) for i in range(0, len(slots), 26)))
+
+    # 2. Mnemonic sources: how many characters target each three-key code
+    targets = array('H', bytes(2 * CODE_SPACE))
+    for char, data in words_map.items():
+        code1 = pinyin_map[char][0] if char in pinyin_map else None
+        third_code = data.get('third_code')
+        if code1 and third_code and is_code(code1 + data['parent_code'] + third_code):
+            targets[code_index(code1 + data['parent_code'] + third_code)] += 1
+    collisions = sum(count - 1 for count in targets if count > 1)
+    collided_codes = sum(1 for count in targets if count > 1)
+
+    # 3. pinyin.cin characters and polyphone initials
+    polyphones = 0
+    polyphone_mem = 0
+    polyphone_taken = 0
+    for char, initials in pinyin_map.items():
+        if len(char) != 1:
+            continue
+        flags[ord(char)] |= CIN
+        distinct = set(initials)
+        if len(distinct) > 1:
+            polyphones += 1
+            if char in words_map and words_map[char].get('third_code'):
+                polyphone_mem += 1
+                data = words_map[char]
+                # Typing the character with one of its other initials lands on someone else's code
+                for initial in distinct - {initials[0]}:
+                    code = initial + data['parent_code'] + data['third_code']
+                    if is_code(code) and slots[code_index(code)]:
+                        polyphone_taken += 1
+                        break
+
+    # 4. Lime keys against the 676 mem blocks
+    lime_blocks = array('H', bytes(2 * 676))
+    lime_shadowed = 0
+    for key, words in keys2word.items():
+        for word in words:
+            if len(word) == 1:
+                flags[ord(word)] |= LIME
+        if is_code(key[:2]) and len(key) >= 2:
+            lime_blocks[block_index(key[:2])] += 1
+            if len(key) == 3 and is_code(key) and slots[code_index(key)]:
+                lime_shadowed += 1
+    overlap_blocks = sum(1 for mem_count, lime_count in zip(block_counts, lime_blocks) if mem_count and lime_count)
+
+    # Report
+    used = sum(block_counts)
+    print("## Three-key code space")
+    print(f"Used codes: {used} / {len(slots)} ({used / len(slots):.2%}), "
+          f"non-empty blocks: {sum(1 for c in block_counts if c)} / 676, "
+          f"full blocks: {sum(1 for c in block_counts if c == 26)}")
+    crowded = sorted(range(676), key=lambda i: -block_counts[i])[:10]
+    print("Most crowded blocks: " + ", ".join(
+        f"{KEYORDER[i // 26]}{KEYORDER[i % 26]}={block_counts[i]}" for i in crowded if block_counts[i]))
+    print(render_heatmap(block_counts))
+
+    print("\n## Collisions in mem*.txt sources")
+    print(f"Characters sharing a code: {collisions} extra on {collided_codes} codes, "
+          f"loader conflict messages: {loader_conflicts}")
+
+    print("\n## Polyphone initials (pinyin.cin)")
+    print(f"Characters with several initials: {polyphones}, of which coded: {polyphone_mem}, "
+          f"alternate initial hits an occupied code: {polyphone_taken}")
+
+    print("\n## Lime keys over mem blocks")
+    print(f"Lime keys: {len(keys2word)}, blocks shared with mem: {overlap_blocks}, "
+          f"3-letter lime keys shadowing a used three-key code: {lime_shadowed}")
+    print(render_heatmap(lime_blocks, scale=max(1, max(lime_blocks))))
+
+    print("\n## Coverage")
+    missing = count_mask(flags, CIN, MEM)
+    print(f"pinyin.cin characters without a three-key code: {missing}")
+    print(f"  e.g. {chars_with_mask(flags, CIN, MEM)}")
+    # (gb) and (jp) tags mark the characters beyond Big5, quoted as "more" and "jismore"
+    for name, bit, quoted in (("Big5", B5, counts.get('big5')), ("GB+", GB, counts.get('more')),
+                              ("JIS+", JP, counts.get('jismore'))):
+        tagged = count_mask(flags, bit)
+        for table_name, table_bit in (("mem", MEM), ("cin", CIN), ("lime", LIME)):
+            covered = count_mask(flags, bit | table_bit)
+            print(f"{name:5} {table_name:4}: {covered:6} / {tagged:6} tagged"
+                  + (f" ({covered / tagged:.2%})" if tagged else "")
+                  + (f", quoted {quoted}" if quoted else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections import Counter, deque
+from collections.abc import Mapping
+
+from atomicfile import replace_file
+from compact import CompactListTable
+
+# Packed trie for large key -> [value, ...] tables (pinyin.cin, lime).
+#
+# The keys are stored once as a trie whose nodes are numbered breadth
+# first, so the children of every node are a contiguous run of node ids and
+# a single first_child offset per node replaces explicit child pointers.
+# All per-node data lives in flat uint32 arrays:
+#   labels       code point of the edge into the node (sorted among siblings)
+#   parent       parent node, to rebuild a key from its node
+#   first_child  children of node n are first_child[n] .. first_child[n + 1]
+#   value_start  values of the key ending at n are values[value_start[n] .. value_start[n + 1]]
+#   sizes        number of keys in the subtree of n
+#   rank         input order of the key ending at n (NO_KEY if none)
+# followed by by_rank (node of the i-th key), the value ids, and a string
+# pool (offsets plus one UTF-8 blob) in which every distinct value is stored
+# once.  The file is memory-mapped and queried in place: a lookup walks one
+# node per key character and bisects its sibling run.
+
+TRIE_MAGIC = b"TKT1"
+TRIE_HEADER = struct.Struct('<4sIIIIIq')  # magic, nodes, keys, values, strings, longest key, source signature
+NO_KEY = 0xFFFFFFFF
+
+def trie_path(source):
+    return os.path.splitext(source)[0] + '.tkt'
+
+def source_signature(sources):
+    """以來源檔的名稱、大小與修改時間產生 64 位元簽章，用於判斷 .tkt 是否過期。"""
+    digest = hashlib.blake2b(digest_size=8)
+    for path in sources:
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode('utf-8'))
+    return struct.unpack('<q', digest.digest())[0]
+
+def write_trie(pairs, path, signature=0):
+    """由 (key, value) 串流編譯 .tkt；同鍵的值與各鍵第一次出現的順序都會保留。"""
+    entries = {}
+    for key, value in pairs:
+        entries.setdefault(key, []).append(value)
+    order = {key: rank for rank, key in enumerate(entries)}
+    keys = sorted(entries)
+
+    strings = {}
+    labels, parent = array('I', [0]), array('I', [0])
+    first_child, value_start, sizes, rank = array('I'), array('I'), array('I'), array('I')
+    values = array('I')
+    queue = deque([(0, len(keys), 0)])  # 節點依加入佇列的順序編號，與 labels 的順序一致
+    while queue:
+        lo, hi, depth = queue.popleft()
+        node = len(first_child)
+        sizes.append(hi - lo)
+        value_start.append(len(values))
+        if lo < hi and len(keys[lo]) == depth:
+            rank.append(order[keys[lo]])
+            values.extend(strings.setdefault(value, len(strings)) for value in entries[keys[lo]])
+            lo += 1
+        else:
+            rank.append(NO_KEY)
+        first_child.append(len(labels))
+        while lo < hi:
+            char = keys[lo][depth]
+            end = lo + 1
+            while end < hi and keys[end][depth] == char:
+                end += 1
+            labels.append(ord(char))
+            parent.append(node)
+            queue.append((lo, end, depth + 1))
+            lo = end
+    first_child.append(len(labels))
+    value_start.append(len(values))
+
+    by_rank = array('I', bytes(4 * len(keys)))
+    for node, key_rank in enumerate(rank):
+        if key_rank != NO_KEY:
+            by_rank[key_rank] = node
+    blob = bytearray()
+    offsets = array('I', [0])
+    for value in strings:  # dict 保留插入順序，即字串編號的順序
+        blob += value.encode('utf-8')
+        offsets.append(len(blob))
+
+    with replace_file(path) as file:
+        file.write(TRIE_HEADER.pack(TRIE_MAGIC, len(labels), len(keys), len(values), len(strings),
+                                    max(map(len, keys), default=0), signature))
+        for column in (labels, parent, first_child, value_start, sizes, rank, by_rank, values, offsets):
+            file.write(column.tobytes())
+        file.write(blob)
+    return path
+
+def trie_stale(path, signature):
+    try:
+        with open(path, 'rb') as file:
+            magic, *_, stored = TRIE_HEADER.unpack(file.read(TRIE_HEADER.size))
+    except (OSError, struct.error):
+        return True
+    return magic != TRIE_MAGIC or stored != signature
+
+def open_trie(sources, read_pairs, path=None):
+    """開啟 sources 編譯成的 .tkt；不存在或來源已更新時先以 read_pairs(sources) 重新編譯。"""
+    path = path or trie_path(sources[0])
+    signature = source_signature(sources)
+    if trie_stale(path, signature):
+        write_trie(read_pairs(sources), path, signature)
+    return TrieTable(path)
+
+class TrieTable(Mapping):
+    """以 mmap 就地查詢的 .tkt 表：key -> [value, ...]，迭代依鍵第一次出現的順序。
+
+    另提供與 prefixindex.PrefixIndex 相同的 matches / count / next_keys / longest，
+    可直接當作前綴索引使用。
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, nodes, self.size, value_count, string_count, self.longest, _ = TRIE_HEADER.unpack_from(self.map)
+        if magic != TRIE_MAGIC:
+            raise ValueError(f"{path}: not a compiled trie")
+        view = memoryview(self.map)[TRIE_HEADER.size:]
+        self.views = []
+        columns = {}
+        offset = 0
+        for name, length in (('labels', nodes), ('parent', nodes), ('first_child', nodes + 1),
+                             ('value_start', nodes + 1), ('sizes', nodes), ('rank', nodes),
+                             ('by_rank', self.size), ('values', value_count), ('offsets', string_count + 1)):
+            columns[name] = view[offset:offset + 4 * length].cast('I')
+            self.views.append(columns[name])
+            offset += 4 * length
+        self.__dict__.update(columns)
+        self.blob = TRIE_HEADER.size + offset
+        view.release()
+
+    def node(self, key):
+        """key 對應的節點；路徑不存在時回傳 -1。"""
+        node = 0
+        labels, first_child = self.labels, self.first_child
+        for char in key:
+            lo, hi = first_child[node], first_child[node + 1]
+            node = bisect_left(labels, ord(char), lo, hi)
+            if node == hi or labels[node] != ord(char):
+                return -1
+        return node
+
+    def key_of(self, node):
+        chars = []
+        while node:
+            chars.append(chr(self.labels[node]))
+            node = self.parent[node]
+        return ''.join(reversed(chars))
+
+    def string(self, i):
+        return self.map[self.blob + self.offsets[i]:self.blob + self.offsets[i + 1]].decode('utf-8')
+
+    def __getitem__(self, key):
+        node = self.node(key)
+        if node < 0 or self.rank[node] == NO_KEY:
+            raise KeyError(key)
+        return [self.string(i) for i in self.values[self.value_start[node]:self.value_start[node + 1]]]
+
+    def __contains__(self, key):
+        node = self.node(key)
+        return node >= 0 and self.rank[node] != NO_KEY
+
+    def __iter__(self):
+        return (self.key_of(node) for node in self.by_rank)
+
+    def __len__(self):
+        return self.size
+
+    def walk(self, prefix):
+        """依鍵排序產生以 prefix 開頭的 (key, node)。"""
+        node = self.node(prefix)
+        if node < 0:
+            return
+        stack = [(node, prefix)]
+        while stack:
+            node, key = stack.pop()
+            if self.rank[node] != NO_KEY:
+                yield key, node
+            for child in reversed(range(self.first_child[node], self.first_child[node + 1])):
+                stack.append((child, key + chr(self.labels[child])))
+
+    def prefix(self, prefix):
+        """依鍵排序產生以 prefix 開頭的 (key, [value, ...])。"""
+        for key, _ in self.walk(prefix):
+            yield key, self[key]
+
+    def matches(self, prefix):
+        """以 prefix 開頭的鍵，依第一次出現的順序（與逐一掃描 dict 相同）。"""
+        found = sorted((self.rank[node], key) for key, node in self.walk(prefix))
+        return [key for _, key in found]
+
+    def count(self, prefix):
+        node = self.node(prefix)
+        return self.sizes[node] if node >= 0 else 0
+
+    def next_keys(self, prefix):
+        """以 prefix 開頭的鍵，下一個按鍵的分布。"""
+        node = self.node(prefix)
+        if node < 0:
+            return Counter()
+        children = range(self.first_child[node], self.first_child[node + 1])
+        return Counter({chr(self.labels[child]): self.sizes[child] for child in children})
+
+    def filtered(self, keep):
+        """只保留 keep(value) 為真之值的記憶體內 CompactListTable（沒有值的鍵略去）。"""
+        table = {}
+        for key in self:
+            kept = [value for value in self[key] if keep(value)]
+            if kept:
+                table[key] = kept
+        return CompactListTable(table)
+
+    def close(self):
+        for view in self.views:
+            view.release()
+        self.map.close()
+        self.file.close()
+
+def read_trie(path):
+    table = TrieTable(path)
+    try:
+        for key in table:
+            for value in table[key]:
+                yield key, value
+    finally:
+        table.close()
@@ -1,9 +1,17 @@
+import argparse
 import os
 import sys
 import termios
 import tty
 from collections import defaultdict
 
+from compact import CompactListTable, ListTableBuilder
+from sinks import OutputWriter, open_sink
+from tableconv import read_cin
+from trie import open_trie
+from uniok import CharsetBits, next_filter
+from userdict import USER_FILE, LayeredTable, UserOverlay
+
 # 讀取鍵盤輸入
 class Getch:
     def __call__(self):
@@ -19,38 +27,41 @@ class Getch:
 getch = Getch()
 
 # 讀取 pinyin.cin 文件
-def load_pinyin_cin(filename):
-    key2ph = defaultdict(list)
+def load_pinyin_cin(filename, key2ph=None):
+    if key2ph is None:
+        key2ph = defaultdict(list)
+    for key, char in read_cin(filename):
+        key2ph[key].append(char)
+    return key2ph
+
+# 讀取 word*.txt 文件
+def word_files(pattern):
+    return [f for f in os.listdir('.') if f.startswith(pattern) and f.endswith('.txt')]
+
+def read_word_file(filename):
+    """產生 (pinyin, word)。"""
     with open(filename, 'r', encoding='utf-8') as f:
-        chardef = False
         for line in f:
             line = line.strip()
-            if line == "%chardef begin":
-                chardef = True
-            elif line == "%chardef end":
-                chardef = False
-            elif chardef and line:
+            if line:
                 parts = line.split()
                 if len(parts) >= 2:
-                    key = parts[0]
-                    char = parts[1]
-                    key2ph[key].append(char)
+                    word = parts[0]
+                    pinyin = parts[1]
+                    yield pinyin, word
+
+def load_word_files(pattern, key2ph=None):
+    if key2ph is None:
+        key2ph = defaultdict(list)
+    for filename in word_files(pattern):
+        for pinyin, word in read_word_file(filename):
+            key2ph[pinyin].append(word)
     return key2ph
 
-# 讀取 word*.txt 文件
-def load_word_files(pattern):
-    key2ph = defaultdict(list)
-    for filename in [f for f in os.listdir('.') if f.startswith(pattern) and f.endswith('.txt')]:
-        with open(filename, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        word = parts[0]
-                        pinyin = parts[1]
-                        key2ph[pinyin].append(word)
-    return key2ph
+def read_tables(paths):
+    """依序產生 pinyin.cin 與 word*.txt 的 (key, value)，詞組接在同鍵位的單字之後。"""
+    for path in paths:
+        yield from read_cin(path) if path.endswith('.cin') else read_word_file(path)
 
 # 打印候選項目
 def display_candidates(candidates):
@@ -60,16 +71,37 @@ def display_candidates(candidates):
 
 # 主程式
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pinyin input loop.")
+    parser.add_argument('--output', action='append', default=[], metavar='KIND:PATH',
+                        help="also send selected words to file:PATH, fifo:PATH, socket:PATH or clipboard[:PATH]")
+    args = parser.parse_args()
     try:
-        key2ph = load_pinyin_cin('pinyin.cin')
-        word_files = load_word_files('word')
-        for key, words in word_files.items():
-            key2ph[key].extend(words)
+        writers = [OutputWriter(open_sink(spec)) for spec in args.output]  # 背景寫出，接收端慢也不影響輸入
+    except (OSError, ValueError) as e:
+        print(f"Error: --output: {e}")
+        sys.exit(2)
+    for writer in writers:
+        writer.start()
+
+    try:
+        # pinyin.cin 與 word*.txt 編譯為 pinyin.tkt 後以 mmap 就地查詢，來源有變動時自動重新編譯；
+        # 無法寫入 pinyin.tkt（例如唯讀目錄）時改為載入欄式表
+        try:
+            key2ph = open_trie(['pinyin.cin'] + word_files('word'), read_tables)
+        except OSError:
+            key2ph = CompactListTable(load_word_files('word', load_pinyin_cin('pinyin.cin', ListTableBuilder())))
+        views = {'all': key2ph}  # 篩選名稱 -> 預先篩好的表，切換時不必逐鍵過濾
+        # 使用者詞庫疊在共用的基底表上，不複製基底表
+        overlay = UserOverlay.load() if os.path.exists(USER_FILE) else None
+        if overlay is not None:
+            key2ph = LayeredTable(key2ph, overlay, numbered=False)
+        charset_filter = 'all'
+        charsets = None
 
         buffer = []
         max_line_length = 20
 
-        print("拼音輸入法 (按 Ctrl-C 或 Ctrl-D 退出，按 ~ 查看完整候選表)")
+        print("拼音輸入法 (按 Ctrl-C 或 Ctrl-D 退出，按 ~ 查看完整候選表，按 = 切換字集篩選)")
         current_input = ""
 
         while True:
@@ -96,6 +128,8 @@ if __name__ == "__main__":
                         while not choice.isdigit() or not (1 <= int(choice) <= len(candidates)):
                             choice = getch()
                         buffer.append(candidates[int(choice) - 1])
+                    for writer in writers:
+                        writer.submit(buffer[-1])
                     current_input = ""
                 else:
                     print("無匹配項，請繼續輸入。")
@@ -108,6 +142,17 @@ if __name__ == "__main__":
                 else:
                     print(current_line)
 
+            elif ch == '=':  # 切換字集篩選
+                charset_filter = next_filter(charset_filter)
+                if charset_filter not in views:
+                    if charsets is None:
+                        charsets = CharsetBits()
+                    views[charset_filter] = views['all'].filtered(charsets.keep(charset_filter))
+                key2ph = views[charset_filter]
+                if overlay is not None:
+                    key2ph = LayeredTable(key2ph, overlay, numbered=False)
+                print(f"字集篩選: {charset_filter}")
+
             elif ch.isalpha():  # 輸入拼音
                 current_input += ch
                 if current_input in key2ph:
@@ -121,3 +166,7 @@ if __name__ == "__main__":
 
     except Exception as e:
         print(f"發生錯誤: {e}")
+    finally:
+        for spec, writer in zip(args.output, writers):
+            writer.close()
+            print(f"輸出 {spec}: {writer.stats()}")
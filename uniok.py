@@ -0,0 +1,128 @@
+import re
+
+# Character-set flags, one bit each, as tagged in uniok_utf8.txt
+UNIOK_FILE = "uniok_utf8.txt"
+B5 = 1
+GB = 2
+JP = 4
+COMMON = 8  # Big5 常用字 (A440-C67E) 或 GB2312 一級字 (B0A1-D7F9)
+TAGS = {'b5': B5, 'gb': GB, 'jp': JP}
+MAX_CODEPOINT = 0x110000
+
+# Candidate filter modes, in the order the input loops cycle through them
+FILTERS = {'all': 0, 'big5': B5, 'gb': GB, 'jp': JP, 'common': COMMON}
+
+# CJK blocks covered by the charset bitsets; other characters always pass a filter
+CJK_RANGES = (
+    (0x2E80, 0x2FDF),    # Radicals
+    (0x3400, 0x4DBF),    # Extension A
+    (0x4E00, 0x9FFF),    # Unified Ideographs
+    (0xF900, 0xFAFF),    # Compatibility Ideographs
+    (0x20000, 0x323AF),  # Extensions B-H
+)
+
+def load_uniok_flags(filename=UNIOK_FILE):
+    """解析 uniok_utf8.txt，建立以 Unicode 碼位為索引的字集旗標表。
+
+    回傳 (flags, counts):
+    flags  - bytearray，flags[ord(char)] 為 B5 | GB | JP 的組合
+    counts - 檔頭註解中記錄的字數，例如 {'gb': 6763, 'big5': 13063, ...}
+    """
+    flags = bytearray(MAX_CODEPOINT)
+    counts = {}
+    with open(filename, encoding='utf-8') as file:
+        for line in file:
+            if line.startswith("# Other:"):
+                for name, value in re.findall(r'(\w+): (\d+)', line):
+                    counts[name] = int(value)
+                continue
+            if not line.startswith("U+"):
+                continue
+            match = re.match(r'^U\+([0-9A-Fa-f]{4,6})', line)
+            if not match:
+                continue
+            bits = 0
+            for tag in re.findall(r'\((b5|gb|jp)\)', line):
+                bits |= TAGS[tag]
+            if bits:
+                flags[int(match[1], 16)] |= bits
+    return flags, counts
+
+def count_flag(flags, bit):
+    """計算 flags 中含有指定位元的碼位數（以 translate/count 一次掃描完成）。"""
+    table = bytes(1 if value & bit else 0 for value in range(256))
+    return flags.translate(table).count(1)
+
+def double_byte(char, codec):
+    """char 在 codec 中的雙位元組編碼（整數），無法編碼時回傳 None。"""
+    try:
+        code = char.encode(codec)
+    except UnicodeEncodeError:
+        return None
+    return int.from_bytes(code, 'big') if len(code) == 2 else None
+
+def charset_bits(char, tags):
+    """由 uniok 標記與編碼表推得完整的字集旗標。
+
+    uniok_utf8.txt 只把每個字標在一個字集：(b5) 為 Big5 字，(gb) 與 (jp) 為
+    Big5 以外的簡體與日本字，因此 Big5 字是否也在 GB2312 / JIS X 0208 需另查編碼表。
+    """
+    bits = tags
+    big5 = double_byte(char, 'big5')
+    gb2312 = double_byte(char, 'gb2312')
+    if gb2312 is not None:
+        bits |= GB
+    if double_byte(char, 'euc_jp') is not None:
+        bits |= JP
+    if (big5 is not None and 0xA440 <= big5 <= 0xC67E) or (gb2312 is not None and 0xB0A1 <= gb2312 <= 0xD7F9):
+        bits |= COMMON
+    return bits
+
+def next_filter(name):
+    names = list(FILTERS)
+    return names[(names.index(name) + 1) % len(names)]
+
+class CharsetBits:
+    """每個字集一個點陣圖（每碼位一位元），只涵蓋 CJK_RANGES，載入一次後供候選過濾使用。"""
+
+    def __init__(self, filename=UNIOK_FILE):
+        flags, self.counts = load_uniok_flags(filename)
+        self.bases = []
+        size = 0
+        for start, end in CJK_RANGES:
+            self.bases.append(size)
+            size += end - start + 1
+        self.bits = {bit: bytearray((size + 7) // 8) for bit in FILTERS.values() if bit}
+        for (start, end), base in zip(CJK_RANGES, self.bases):
+            for codepoint in range(start, end + 1):
+                value = flags[codepoint]
+                if not value:
+                    continue
+                value = charset_bits(chr(codepoint), value)
+                index = base + codepoint - start
+                for bit, bitset in self.bits.items():
+                    if value & bit:
+                        bitset[index >> 3] |= 1 << (index & 7)
+
+    def index(self, char):
+        codepoint = ord(char)
+        for (start, end), base in zip(CJK_RANGES, self.bases):
+            if start <= codepoint <= end:
+                return base + codepoint - start
+        return -1
+
+    def accepts(self, text, bit):
+        """text 中每個 CJK 字都屬於 bit 所指的字集時為真；bit 為 0 時一律為真。"""
+        if not bit:
+            return True
+        bitset = self.bits[bit]
+        for char in text:
+            index = self.index(char)
+            if index >= 0 and not bitset[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+
+    def keep(self, name):
+        """回傳篩選函式，供 CompactListTable.filtered() 等使用。"""
+        bit = FILTERS[name]
+        return lambda text: self.accepts(text, bit)
@@ -0,0 +1,188 @@
+import argparse
+import os
+import sys
+from collections.abc import Mapping
+
+from atomicfile import replace_file
+
+# Per-user dictionary overlay.
+#
+# The base tables (pinyin.cin, the lime file and word*.txt, loaded into the
+# shared compact tables) are never copied or modified.  A user's changes are
+# kept as a small overlay of per-key operations:
+#   + key phrase   add the phrase after the base phrases of key
+#   - key phrase   hide a base phrase
+#   ^ key phrase   move the phrase to the front (later ^ lines follow it)
+# LayeredTable merges the overlay into a base table on each lookup, and only
+# for keys the overlay touches; every other key is answered by the base
+# table directly.  Saving writes the overlay alone.
+
+USER_FILE = 'user_words.txt'
+
+class UserOverlay:
+    """使用者詞庫的增刪與排序；只記錄有變動的鍵。"""
+
+    def __init__(self):
+        self.added = {}  # key -> [phrase, ...]
+        self.deleted = {}  # key -> {phrase, ...}
+        self.promoted = {}  # key -> [phrase, ...]，依序排在最前面
+        self.longest = 0  # 變動過的最長鍵長，供 commit_buffer 的 max_key_len
+
+    def __len__(self):
+        return sum(len(phrases) for table in (self.added, self.deleted, self.promoted) for phrases in table.values())
+
+    def __contains__(self, key):
+        return key in self.added or key in self.deleted or key in self.promoted
+
+    def keys(self):
+        """所有變動過的鍵。"""
+        return self.added.keys() | self.deleted.keys() | self.promoted.keys()
+
+    def touch(self, key):
+        self.longest = max(self.longest, len(key))
+
+    def add(self, key, phrase):
+        self.touch(key)
+        deleted = self.deleted.get(key, ())
+        if phrase in deleted:
+            deleted.discard(phrase)
+        elif phrase not in self.added.get(key, ()):
+            self.added.setdefault(key, []).append(phrase)
+        self.prune(key)
+
+    def delete(self, key, phrase):
+        self.touch(key)
+        if phrase in self.added.get(key, ()):
+            self.added[key].remove(phrase)
+        else:
+            self.deleted.setdefault(key, set()).add(phrase)
+        if phrase in self.promoted.get(key, ()):
+            self.promoted[key].remove(phrase)
+        self.prune(key)
+
+    def promote(self, key, phrase):
+        self.touch(key)
+        promoted = self.promoted.setdefault(key, [])
+        if phrase in promoted:
+            promoted.remove(phrase)
+        promoted.insert(0, phrase)
+
+    def prune(self, key):
+        for table in (self.added, self.deleted, self.promoted):
+            if key in table and not table[key]:
+                del table[key]
+
+    def merge(self, key, base_phrases):
+        """key 在基底表中的詞組套用變動後的結果。"""
+        deleted = self.deleted.get(key, ())
+        phrases = [phrase for phrase in base_phrases if phrase not in deleted]
+        phrases += [phrase for phrase in self.added.get(key, ()) if phrase not in phrases]
+        promoted = [phrase for phrase in self.promoted.get(key, ()) if phrase in phrases]
+        return promoted + [phrase for phrase in phrases if phrase not in promoted]
+
+    def new_keys(self, base):
+        """只由使用者新增、基底表中沒有的鍵。"""
+        return [key for key in self.added if key not in base]
+
+    def lines(self):
+        for key, phrases in self.added.items():
+            yield from (f"+ {key} {phrase}" for phrase in phrases)
+        for key, phrases in self.deleted.items():
+            yield from (f"- {key} {phrase}" for phrase in sorted(phrases))
+        for key, phrases in self.promoted.items():
+            yield from (f"^ {key} {phrase}" for phrase in reversed(phrases))
+
+    def save(self, path=USER_FILE):
+        """只寫出變動；先寫暫存檔再替換。"""
+        with replace_file(path, 'w', encoding='utf-8') as file:
+            file.writelines(line + "\n" for line in self.lines())
+
+    @classmethod
+    def load(cls, path=USER_FILE):
+        """讀取使用者詞庫；檔案不存在時回傳空的 overlay。"""
+        overlay = cls()
+        if not os.path.exists(path):
+            return overlay
+        actions = {'+': overlay.add, '-': overlay.delete, '^': overlay.promote}
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                parts = line.rstrip('\n').split(' ', 2)
+                if len(parts) == 3 and parts[0] in actions and parts[1] and parts[2]:
+                    actions[parts[0]](parts[1], parts[2])
+                elif line.strip() and not line.startswith('#'):
+                    print(f"Invalid line format: {line.strip()}")
+        return overlay
+
+class LayeredTable(Mapping):
+    """基底表加上 UserOverlay 的唯讀檢視，基底表不複製。
+
+    numbered=True 時基底為 cuf1 的 key2ph（key -> [(num, [phrase])]），
+    有變動的鍵依合併後的順序重新編號 1, 2, ...；否則為 key -> [phrase]。
+    """
+
+    def __init__(self, base, overlay, numbered=True):
+        self.base = base
+        self.overlay = overlay
+        self.numbered = numbered
+
+    def __getitem__(self, key):
+        if key not in self.overlay:
+            return self.base[key]
+        entries = self.base.get(key, ())
+        phrases = [''.join(words) for _, words in entries] if self.numbered else list(entries)
+        merged = self.overlay.merge(key, phrases)
+        if not merged:
+            raise KeyError(key)
+        if self.numbered:
+            return [(number, [phrase]) for number, phrase in enumerate(merged, start=1)]
+        return merged
+
+    def __contains__(self, key):
+        if key not in self.overlay:
+            return key in self.base
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for key in self.base:
+            if key not in self.overlay or key in self:
+                yield key
+        yield from self.overlay.new_keys(self.base)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def matches(self, base_keys, prefix):
+        """由基底表的前綴查詢結果（例如 PrefixIndex.matches）加上使用者新增的鍵。"""
+        keys = [key for key in base_keys if key in self]
+        return keys + sorted(key for key in self.overlay.new_keys(self.base) if key.startswith(prefix))
+
+def main():
+    parser = argparse.ArgumentParser(description="Edit the personal phrase overlay.")
+    parser.add_argument('--file', default=USER_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('add', "add a phrase under a key"), ('delete', "hide a phrase of a key"),
+                            ('promote', "move a phrase of a key to the front")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('key')
+        command.add_argument('phrase')
+    commands.add_parser('list', help="print the overlay")
+    args = parser.parse_args()
+
+    overlay = UserOverlay.load(args.file)
+    if args.command == 'list':
+        for line in overlay.lines():
+            print(line)
+        return
+    if ' ' in args.key or '\n' in args.phrase:
+        print("Error: the key may not contain spaces and the phrase may not contain newlines.", file=sys.stderr)
+        sys.exit(2)
+    {'add': overlay.add, 'delete': overlay.delete, 'promote': overlay.promote}[args.command](args.key, args.phrase)
+    overlay.save(args.file)
+    print(f"{args.file}: {len(overlay)} changes")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,30 @@
 # Python script: view_tmp.py
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from atomicfile import replace_file
+from codespace import CODE_SPACE, EMPTY_SLOT, KEYORDER, code_index
+from tableconv import read_tksm
+
+# Query tool for tmp_tksm_words.txt.
+#
+# The table is compiled once into a side file (tmp_tksm_words.tki) that is
+# memory-mapped for every query:
+#   header  - magic, number of used codes, size and mtime of the source table
+#   forward - 17576 uint32 code points, one per three-key code (0 = empty)
+#   reverse - the used code points sorted, then their code indexes in the same order
+# Forward and block lookups are a single array access, reverse lookups a
+# bisect; the index is rebuilt automatically when the table is newer.
+
+TABLE_FILE = 'tmp_tksm_words.txt'
+INDEX_MAGIC = b"TKI1"
+INDEX_HEADER = struct.Struct('<4sIqq')
+
 def process_file(file_path):
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
@@ -13,7 +39,169 @@ def process_file(file_path):
     except Exception as e:
         print(f"An error occurred: {e}")
 
-# Replace 'tmp_tksm_words.txt' with the actual path to your file
+def index_path(table_path):
+    return os.path.splitext(table_path)[0] + '.tki'
+
+def code_name(index):
+    return KEYORDER[index // 676] + KEYORDER[index // 26 % 26] + KEYORDER[index % 26]
+
+def build_index(table_path=TABLE_FILE):
+    """由三碼表產生索引檔；先寫入暫存檔再替換，查詢中的程式不會讀到寫了一半的檔。"""
+    forward = array('I', bytes(4 * CODE_SPACE))
+    for code, char in read_tksm(table_path):
+        forward[code_index(code)] = ord(char)
+    pairs = sorted((codepoint, index) for index, codepoint in enumerate(forward) if codepoint)
+    stat = os.stat(table_path)
+    path = index_path(table_path)
+    with replace_file(path) as file:
+        file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(pairs), stat.st_size, stat.st_mtime_ns))
+        file.write(forward.tobytes())
+        file.write(array('I', (codepoint for codepoint, _ in pairs)).tobytes())
+        file.write(array('I', (index for _, index in pairs)).tobytes())
+    return path
+
+class TksmIndex:
+    """以 mmap 開啟三碼表索引，提供正查、反查、區塊與空位查詢。"""
+
+    def __init__(self, table_path=TABLE_FILE):
+        path = index_path(table_path)
+        if self.stale(table_path, path):
+            build_index(table_path)
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, _, _ = INDEX_HEADER.unpack_from(self.map)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{path}: not a three-key table index")
+        view = memoryview(self.map)[INDEX_HEADER.size:].cast('I')
+        self.forward = view[:CODE_SPACE]
+        self.chars = view[CODE_SPACE:CODE_SPACE + self.count]
+        self.codes = view[CODE_SPACE + self.count:CODE_SPACE + 2 * self.count]
+
+    @staticmethod
+    def stale(table_path, path):
+        try:
+            with open(path, 'rb') as file:
+                magic, _, size, mtime = INDEX_HEADER.unpack(file.read(INDEX_HEADER.size))
+        except (OSError, struct.error):
+            return True
+        stat = os.stat(table_path)
+        return magic != INDEX_MAGIC or (size, mtime) != (stat.st_size, stat.st_mtime_ns)
+
+    def char_at(self, code):
+        """三碼對應的字，空位或不是三碼時回傳 None。"""
+        index = code_index(code)
+        if index < 0 or not self.forward[index]:
+            return None
+        return chr(self.forward[index])
+
+    def codes_of(self, char):
+        """字的所有三碼（依碼排序）。"""
+        codepoint = ord(char)
+        lo = bisect_left(self.chars, codepoint)
+        hi = bisect_right(self.chars, codepoint, lo)
+        return sorted(code_name(self.codes[i]) for i in range(lo, hi))
+
+    def block(self, block):
+        """兩碼區塊的 26 個位置，空位以 ﹏ 表示。"""
+        start = code_index(block + 'a')
+        if start < 0:
+            raise ValueError(f"{block!r} is not a two-key block")
+        return ''.join(chr(codepoint) if codepoint else EMPTY_SLOT for codepoint in self.forward[start:start + 26])
+
+    def free_codes(self, prefix=''):
+        """以 prefix（0 到 3 個字母）開頭的空三碼。"""
+        if len(prefix) > 3 or any(key not in KEYORDER for key in prefix):
+            raise ValueError(f"{prefix!r} is not a code prefix")
+        start = code_index(prefix + 'a' * (3 - len(prefix)))
+        end = start + 26 ** (3 - len(prefix))
+        for index in range(start, end):
+            if not self.forward[index]:
+                yield code_name(index)
+
+    def close(self):
+        for view in (self.forward, self.chars, self.codes):
+            view.release()
+        self.map.close()
+        self.file.close()
+
+def answer(index, command, args, limit=None):
+    """執行一個查詢，回傳輸出行；無結果時回傳空串列。"""
+    lines = []
+    if command == 'code':
+        for code in args:
+            char = index.char_at(code)
+            if char is not None:
+                lines.append(f"{code}\t{char}")
+    elif command == 'char':
+        for char in ''.join(args):
+            lines.extend(f"{char}\t{code}" for code in index.codes_of(char))
+    elif command == 'block':
+        for block in args:
+            lines.append(f"{block}\t{index.block(block)}")
+    elif command == 'free':
+        for prefix in args or ['']:
+            for code in index.free_codes(prefix):
+                if limit is not None and len(lines) >= limit:
+                    break
+                lines.append(code)
+    else:
+        raise ValueError(f"unknown query {command!r}")
+    return lines
+
+def serve(index, limit):
+    """每行讀一個查詢（例如 "char 中"），輸出結果後以空行結束，供編輯器外掛常駐使用。"""
+    for line in sys.stdin:
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            lines = answer(index, parts[0], parts[1:], limit)
+        except ValueError as e:
+            lines = [f"error: {e}"]
+        print("\n".join(lines + ['']), flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or query the generated three-key table.")
+    parser.add_argument('--table', default=TABLE_FILE)
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('dump', help="print the whole table (the default)")
+    commands.add_parser('build', help="rebuild the index file")
+    commands.add_parser('code', help="three-key code -> character").add_argument('codes', nargs='+')
+    commands.add_parser('char', help="character -> three-key codes").add_argument('chars', nargs='+')
+    commands.add_parser('block', help="two-key block -> its 26 slots").add_argument('blocks', nargs='+')
+    free_parser = commands.add_parser('free', help="free codes, optionally under a prefix")
+    free_parser.add_argument('prefixes', nargs='*')
+    free_parser.add_argument('--limit', type=int, default=None)
+    serve_parser = commands.add_parser('serve', help="answer queries read line by line from stdin")
+    serve_parser.add_argument('--limit', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command in (None, 'dump'):
+        process_file(args.table)
+        return
+    if not os.path.exists(args.table):
+        print(f"Error: File '{args.table}' not found.", file=sys.stderr)
+        sys.exit(2)
+    if args.command == 'build':
+        print(f"Written {build_index(args.table)}")
+        return
+
+    index = TksmIndex(args.table)
+    try:
+        if args.command == 'serve':
+            serve(index, args.limit)
+            return
+        query = {'code': 'codes', 'char': 'chars', 'block': 'blocks', 'free': 'prefixes'}[args.command]
+        try:
+            lines = answer(index, args.command, getattr(args, query), getattr(args, 'limit', None))
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(2)
+        if lines:
+            print("\n".join(lines))
+        sys.exit(0 if lines else 1)
+    finally:
+        index.close()
+
 if __name__ == "__main__":
-    file_path = 'tmp_tksm_words.txt'
-    process_file(file_path)
+    main()